@@ -2,28 +2,71 @@ import os
 import threading
 import time
 import json
-import re
+import asyncio
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from queue import Queue
 from sys import platform
 from fastapi import FastAPI, HTTPException, Body
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import speech_recognition as sr
-import whisper
-import torch
-import google.generativeai as genai
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
 from dotenv import load_dotenv
-import numpy as np
-from typing import List, Optional
+from typing import Optional
+from prompt_builder import PromptBuilder, TechnicalTerms, estimate_tokens
+from meeting_summary import MeetingSummarizer
+from meeting_archive import MeetingArchive, clamp_page
+from startup import Readiness, FAILED
+from llm_scheduler import LLMScheduler, ContentTrigger, SchedulerBusy, ACTIVE, BACKGROUND, BACKFILL
 
 # Load environment variables
 load_dotenv()
 GEMINI_API_KEY = os.getenv('GOOGLE_API_KEY')
 LLM_OUTPUT_FILE = "llm_definitions.jsonl"
+LIVE_SESSION_ID = "live"  # session used by the microphone transcription pipeline
+ARCHIVE_DB = os.getenv('MEETSIGHT_ARCHIVE_DB', 'meetings.db')
+WHISPER_MODEL = "base"
+LLM_REQUESTS_PER_MINUTE = int(os.getenv('LLM_REQUESTS_PER_MINUTE', '30'))
+LLM_TOKENS_PER_MINUTE = int(os.getenv('LLM_TOKENS_PER_MINUTE', '1000000'))
+EXTRACT_TIMEOUT_SECONDS = 20  # /llm/extract_terms gives up (429/503) after this long
+
+# Heavy subsystems (torch/whisper, genai) are imported and loaded after the
+# server starts, so health checks are served while they come up.
+readiness = Readiness()
+whisper_model = None
+archive = None
+
+def init_archive():
+    global archive
+    archive = MeetingArchive(ARCHIVE_DB)
+
+def init_gemini():
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+
+def init_whisper():
+    global whisper_model
+    import whisper
+    whisper_model = whisper.load_model(WHISPER_MODEL)
+
+def require(name, timeout=None):
+    """Wait up to timeout seconds for subsystem name, raising 503 if it is not ready."""
+    if not readiness.wait(name, timeout):
+        raise HTTPException(status_code=503, detail=f"{name} is not ready ({readiness.state(name)}).")
+
+@asynccontextmanager
+async def lifespan(app):
+    readiness.run("archive", init_archive, background=False)
+    readiness.run("gemini", init_gemini)
+    # Only live transcription needs Whisper; it is loaded on the first /transcription/start
+    readiness.register("whisper", required=False)
+    yield
+    transcription_running.clear()
+    llm_running.clear()
 
 # FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -32,8 +75,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-genai.configure(api_key=GEMINI_API_KEY)
-
 # Globals for background tasks
 transcription_thread = None
 llm_thread = None
@@ -44,22 +85,13 @@ llm_running = threading.Event()
 class SharedState:
     def __init__(self):
         self.transcription = []  # list of strings
-        self.transcription_buffer = []  # list of (timestamp, text)
         self.llm_output = None
+        self.meeting_id = None  # archive id of the current live meeting
         self.lock = threading.Lock()
 
     def add_transcription(self, text):
         with self.lock:
             self.transcription.append(text)
-            self.transcription_buffer.append((datetime.utcnow(), text))
-            # Keep only last 30 seconds
-            cutoff = datetime.utcnow() - timedelta(seconds=30)
-            self.transcription_buffer = [x for x in self.transcription_buffer if x[0] >= cutoff]
-
-    def get_last_n_seconds(self, seconds=5):
-        with self.lock:
-            cutoff = datetime.utcnow() - timedelta(seconds=seconds)
-            return ' '.join([t for ts, t in self.transcription_buffer if ts >= cutoff])
 
     def get_transcription(self):
         with self.lock:
@@ -76,53 +108,41 @@ class SharedState:
 shared_state = SharedState()
 
 # Gemini LLM call
-SCHEMA = '''
-{
-  "type": "object",
-  "properties": {
-    "technical_terms": {
-      "type": "array",
-      "description": "A list of all technical terms (not basic/common ones) mentioned in the transcript, along with definitions, contextual explanations, and difficulty rating (1-5, 5=most difficult). Only include terms that would be unfamiliar to a typical tech student.",
-      "items": {
-        "type": "object",
-        "properties": {
-          "term": {"type": "string", "description": "The niche technical term or jargon identified in the transcript."},
-          "definition": {"type": "string", "description": "A clear and concise definition of the technical term."},
-          "contextual_explanation": {"type": "string", "description": "An explanation of how the term is used or meant within the current transcript, tailored for a tech student with basic knowledge."},
-          "example_quote": {"type": "string", "description": "A direct quote or sentence from the transcript where the term appears."},
-          "difficulty": {"type": "integer", "description": "Difficulty of the term for a typical tech student (1=easy, 4=very difficult)", "minimum": 1, "maximum": 4}
-        },
-        "required": ["term", "definition", "contextual_explanation", "difficulty"]
-      }
-    }
-  },
-  "required": ["technical_terms"]
-}
-'''
-
-def get_gemini_definitions(text):
-    prompt = (
-        "Extract all technical terms (not basic/common ones) from the following text and provide their definitions, context, and a difficulty rating (1-4, 4=most difficult).",
-        "Only include terms that would be unfamiliar to a typical employee at a bank with basic knowledge.",
-        "Return the result as a JSON object matching this schema (if no terms, use an empty list for 'technical_terms'):\n"
-        + SCHEMA
-        + "\nText:\n"
-        + text
-    )
-    model = genai.GenerativeModel('gemini-2.0-flash')
-    response = model.generate_content(prompt)
-    match = re.search(r'\{[\s\S]*\}', response.text)
-    if match:
-        json_str = match.group(0)
-        try:
-            return json.loads(json_str)
-        except Exception as e:
-            print(f"[LLM JSON ERROR] {e}\nRaw output: {json_str}")
-            return None
-    else:
-        print(f"[LLM NO JSON FOUND] Raw output: {response.text}")
+TERMS_INSTRUCTIONS = (
+    "Extract all niche technical terms (not basic/common ones) from the CHUNK and provide their definitions, "
+    "context, and a difficulty rating (1-4, 4=most difficult). Use the CONTEXT only to help disambiguate the "
+    "meaning of terms, but only extract terms that appear in the CHUNK. Only include terms that would be "
+    "unfamiliar to a typical bank employee with basic knowledge. Do not repeat ALREADY DEFINED terms. "
+    "If there are no terms, return an empty list for 'technical_terms'."
+)
+TERMS_RESPONSE_TOKENS = 500  # rough output size, counted against the token budget
+prompt_builder = PromptBuilder(TERMS_INSTRUCTIONS)
+
+# All Gemini calls share one scheduler so rate limits hold across sessions
+scheduler = LLMScheduler(LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE)
+
+def extract_terms_scheduled(chunk, context=None, session_id=None, timeout=None):
+    # Only the Gemini request goes through the scheduler (and may be retried
+    # or hedged); the response is parsed and its terms remembered once.
+    tokens = estimate_tokens(chunk) + estimate_tokens(context or '') + TERMS_RESPONSE_TOKENS
+    call = lambda request: scheduler.call(request, session_id=session_id, tokens=tokens, timeout=timeout)
+    return prompt_builder.extract(chunk, context, session_id, call=call)
+
+def get_gemini_definitions(text, session_id=None):
+    try:
+        return extract_terms_scheduled(text, session_id=session_id).model_dump()
+    except ValidationError:
         return None
 
+summarizer = MeetingSummarizer(scheduler=scheduler)
+live_trigger = ContentTrigger()  # decides when new live transcript text goes to the LLM
+
+def record_final_phrase(text):
+    live_trigger.add(text)
+    summarizer.add_text(LIVE_SESSION_ID, text)
+    if archive is not None:
+        archive.add_segment(shared_state.meeting_id, text)
+
 # Background transcription
 class TranscriptionWorker(threading.Thread):
     def __init__(self, shared_state, record_timeout=2.0, phrase_timeout=3.0):
@@ -133,11 +153,11 @@ class TranscriptionWorker(threading.Thread):
         self.data_queue = Queue()
         self.phrase_bytes = bytes()
         self.phrase_time = None
+        import speech_recognition as sr
         self.recorder = sr.Recognizer()
         self.recorder.energy_threshold = 1000
         self.recorder.dynamic_energy_threshold = False
         self.running = transcription_running
-        self.audio_model = whisper.load_model("base")
         if 'linux' in platform:
             mic_name = "pulse"
             for index, name in enumerate(sr.Microphone.list_microphone_names()):
@@ -149,14 +169,19 @@ class TranscriptionWorker(threading.Thread):
         else:
             self.source = sr.Microphone(sample_rate=16000)
 
-    def record_callback(self, _, audio: sr.AudioData):
+    def record_callback(self, _, audio):
         data = audio.get_raw_data()
         self.data_queue.put(data)
 
     def run(self):
+        import numpy as np
+        import torch
+        if not readiness.wait("whisper"):
+            print(f"[TRANSCRIPTION] Whisper failed to load: {readiness.report()['subsystems']['whisper']['error']}")
+            return
         with self.source:
             self.recorder.adjust_for_ambient_noise(self.source)
-        self.recorder.listen_in_background(self.source, self.record_callback, phrase_time_limit=self.record_timeout)
+        stop_listening = self.recorder.listen_in_background(self.source, self.record_callback, phrase_time_limit=self.record_timeout)
         while self.running.is_set():
             now = datetime.utcnow()
             if not self.data_queue.empty():
@@ -169,9 +194,13 @@ class TranscriptionWorker(threading.Thread):
                 self.data_queue.queue.clear()
                 self.phrase_bytes += audio_data
                 audio_np = np.frombuffer(self.phrase_bytes, dtype=np.int16).astype(np.float32) / 32768.0
-                result = self.audio_model.transcribe(audio_np, fp16=torch.cuda.is_available())
+                result = whisper_model.transcribe(audio_np, fp16=torch.cuda.is_available())
                 text = result['text'].strip()
                 if phrase_complete:
+                    # The previous phrase is final now that a new one started
+                    with self.shared_state.lock:
+                        previous = self.shared_state.transcription[-1] if self.shared_state.transcription else ''
+                    record_final_phrase(previous)
                     self.shared_state.add_transcription(text)
                 else:
                     # Overwrite last
@@ -180,34 +209,57 @@ class TranscriptionWorker(threading.Thread):
                             self.shared_state.transcription[-1] = text
                         else:
                             self.shared_state.transcription.append(text)
-                        self.shared_state.transcription_buffer.append((datetime.utcnow(), text))
+                # The trigger may send the phrase early; its final text follows via record_final_phrase
+                live_trigger.update_phrase(text)
                 time.sleep(0.1)
             else:
                 time.sleep(0.25)
+        stop_listening(wait_for_stop=False)
+        # Finalize the phrase in progress; only this thread records phrases,
+        # so a stop request can't record the same phrase twice
+        with self.shared_state.lock:
+            last = self.shared_state.transcription[-1] if self.shared_state.transcription else ''
+        record_final_phrase(last)
+        summarizer.flush(LIVE_SESSION_ID)
 
 # Background LLM
 class LLMWorker(threading.Thread):
-    def __init__(self, shared_state, interval=5):
+    def __init__(self, shared_state, trigger, poll_interval=0.25):
         super().__init__(daemon=True)
         self.shared_state = shared_state
-        self.interval = interval
+        self.trigger = trigger
+        self.poll_interval = poll_interval
         self.running = llm_running
 
     def run(self):
+        readiness.wait("gemini")
         while self.running.is_set():
-            time.sleep(self.interval)
-            recent_text = self.shared_state.get_last_n_seconds(self.interval)
-            if recent_text.strip():
-                definitions = get_gemini_definitions(recent_text)
-                if definitions:
-                    obj = {
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "transcript": recent_text,
-                        "llm_output": definitions
-                    }
-                    with open(LLM_OUTPUT_FILE, 'a', encoding='utf-8') as f:
-                        f.write(json.dumps(obj) + '\n')
-                    self.shared_state.set_llm_output(obj)
+            time.sleep(self.poll_interval)
+            text = self.trigger.poll()
+            if text:
+                self.process(text)
+        # Don't drop what was said just before stopping
+        text = self.trigger.flush()
+        if text:
+            self.process(text)
+
+    def process(self, text):
+        try:
+            definitions = get_gemini_definitions(text, session_id=LIVE_SESSION_ID)
+        except Exception as e:
+            print(f"[LLM ERROR] {e}")
+            return
+        if definitions:
+            obj = {
+                "timestamp": datetime.utcnow().isoformat(),
+                "transcript": text,
+                "llm_output": definitions
+            }
+            with open(LLM_OUTPUT_FILE, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(obj) + '\n')
+            self.shared_state.set_llm_output(obj)
+            if archive is not None:
+                archive.add_terms(self.shared_state.meeting_id, definitions['technical_terms'])
 
 # API Models
 class StatusResponse(BaseModel):
@@ -215,38 +267,58 @@ class StatusResponse(BaseModel):
 
 class ExtractTermsRequest(BaseModel):
     chunk: str
-    context: str
+    context: str = ""
+    session_id: Optional[str] = None
+
+ExtractTermsResponse = TechnicalTerms
 
-class TechnicalTerm(BaseModel):
-    term: str
-    definition: str
-    contextual_explanation: str
-    example_quote: Optional[str] = None
-    difficulty: int
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
 
-class ExtractTermsResponse(BaseModel):
-    technical_terms: List[TechnicalTerm]
+@app.get("/ready")
+async def ready():
+    """
+    Per-subsystem load state and time-to-ready. Returns 503 until every subsystem is ready.
+    """
+    report = readiness.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
 
 @app.post("/transcription/start", response_model=StatusResponse)
 def start_transcription():
     global transcription_thread, llm_thread
     if transcription_running.is_set():
         return {"running": True}
+    if readiness.state("whisper") == FAILED:
+        raise HTTPException(status_code=503, detail="whisper failed to load.")
+    readiness.run("whisper", init_whisper)  # no-op once loading or loaded
+    # Let a previous run finish finalizing its last phrase before state is cleared
+    for thread in (transcription_thread, llm_thread):
+        if thread is not None:
+            thread.join(timeout=10)
     transcription_running.set()
     llm_running.set()
     shared_state.transcription.clear()
-    shared_state.transcription_buffer.clear()
     shared_state.llm_output = None
+    shared_state.meeting_id = f"{LIVE_SESSION_ID}-{datetime.utcnow():%Y%m%dT%H%M%S}"
+    prompt_builder.forget(LIVE_SESSION_ID)
+    summarizer.reset(LIVE_SESSION_ID)
+    live_trigger.reset()
+    scheduler.clear_priority(LIVE_SESSION_ID)
     transcription_thread = TranscriptionWorker(shared_state)
-    llm_thread = LLMWorker(shared_state)
+    llm_thread = LLMWorker(shared_state, live_trigger)
     transcription_thread.start()
     llm_thread.start()
     return {"running": True}
 
 @app.post("/transcription/stop", response_model=StatusResponse)
 def stop_transcription():
+    if not transcription_running.is_set():
+        return {"running": False}
     transcription_running.clear()
     llm_running.clear()
+    # What is left of the stopped meeting (last terms, summary) is no longer urgent
+    scheduler.set_priority(LIVE_SESSION_ID, BACKFILL)
     return {"running": False}
 
 @app.get("/transcription/live")
@@ -263,39 +335,112 @@ def get_latest_llm():
 @app.post("/llm/extract_terms", response_model=ExtractTermsResponse)
 def extract_terms(request: ExtractTermsRequest):
     """
-    Extract niche technical terms from the chunk, using context for disambiguation only. Only extract terms from the chunk, not the context. Only include terms that would be unfamiliar to a typical tech student with basic knowledge. Add a difficulty rating (1-5, 5=most difficult) for each term.
+    Extract niche technical terms from the chunk, using context for disambiguation only. Only extract terms from the chunk, not the context. Terms already returned for the same session_id are skipped.
+    Returns 429 if the LLM queue is too busy to start the call in time, 503 if the call itself timed out.
     """
-    chunk = request.chunk
-    context = request.context
-    prompt = (
-        "Extract all niche technical terms (not basic/common ones) from the following CHUNK and provide their definitions, context, and a difficulty rating (1-4, 4=most difficult).",
-        "Use the CONTEXT only to help disambiguate the meaning of terms, but only extract terms that appear in the CHUNK. Only include terms that would be unfamiliar to a typical bank employee with basic knowledge.",
-        "Return the result as a JSON object matching this schema (if no terms, use an empty list for 'technical_terms'):\n" + SCHEMA +
-        f"\nCHUNK:\n{chunk}\n",
-        f"\nCONTEXT:\n{context}"
-    )
-    model = genai.GenerativeModel('gemini-2.0-flash')
-    response = model.generate_content(prompt)
-    match = re.search(r'\{[\s\S]*\}', response.text)
-    if match:
-        json_str = match.group(0)
-        try:
-            data = json.loads(json_str)
-            terms = data.get('technical_terms', [])
-            # Ensure all required fields are present
-            result_terms = []
-            for t in terms:
-                result_terms.append(TechnicalTerm(
-                    term=t.get('term', ''),
-                    definition=t.get('definition', ''),
-                    contextual_explanation=t.get('contextual_explanation', ''),
-                    example_quote=t.get('example_quote'),
-                    difficulty=t.get('difficulty', 1)
-                ))
-            return ExtractTermsResponse(technical_terms=result_terms)
-        except Exception as e:
-            print(f"[LLM JSON ERROR] {e}\nRaw output: {json_str}")
-            raise HTTPException(status_code=500, detail="LLM output parsing error.")
-    else:
-        print(f"[LLM NO JSON FOUND] Raw output: {response.text}")
-        return ExtractTermsResponse(technical_terms=[]) 
+    require("gemini", timeout=10)
+    if request.session_id:
+        summarizer.add_text(request.session_id, request.chunk)
+        if archive is not None:
+            archive.add_segment(request.session_id, request.chunk)
+    try:
+        result = extract_terms_scheduled(request.chunk, request.context, request.session_id,
+                                         timeout=EXTRACT_TIMEOUT_SECONDS)
+    except ValidationError:
+        raise HTTPException(status_code=500, detail="LLM output parsing error.")
+    except SchedulerBusy:
+        raise HTTPException(status_code=429, detail="LLM is busy, try again later.",
+                            headers={"Retry-After": str(EXTRACT_TIMEOUT_SECONDS)})
+    except FutureTimeoutError:
+        raise HTTPException(status_code=503, detail="LLM call timed out.")
+    if request.session_id and archive is not None:
+        archive.add_terms(request.session_id, [t.model_dump() for t in result.technical_terms])
+    return result
+
+@app.delete("/llm/sessions/{session_id}")
+def clear_session(session_id: str):
+    prompt_builder.forget(session_id)
+    summarizer.reset(session_id)
+    scheduler.clear_priority(session_id)
+    return {"session_id": session_id, "cleared": True}
+
+SESSION_PRIORITIES = {"active": ACTIVE, "background": BACKGROUND, "backfill": BACKFILL}
+
+class PriorityRequest(BaseModel):
+    priority: str
+
+@app.post("/llm/sessions/{session_id}/priority")
+def set_session_priority(session_id: str, request: PriorityRequest):
+    """
+    Set how urgent session_id's LLM work is: active (default), background or backfill. Backfill sessions only run when nothing more urgent is queued.
+    """
+    if request.priority not in SESSION_PRIORITIES:
+        raise HTTPException(status_code=422, detail=f"priority must be one of {', '.join(SESSION_PRIORITIES)}.")
+    scheduler.set_priority(session_id, SESSION_PRIORITIES[request.priority])
+    return {"session_id": session_id, "priority": request.priority}
+
+@app.get("/meeting/{session_id}/summary")
+def get_meeting_summary(session_id: str):
+    snapshot = summarizer.get(session_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="No transcript for this session yet.")
+    return snapshot
+
+@app.get("/meeting/{session_id}/action_items")
+def get_action_items(session_id: str):
+    snapshot = summarizer.get(session_id)
+    if snapshot is None:
+        return {"session_id": session_id, "action_items": [], "version": 0}
+    return {"session_id": session_id, "action_items": snapshot["action_items"], "version": snapshot["version"]}
+
+@app.post("/meeting/{session_id}/flush")
+def flush_meeting(session_id: str):
+    summarizer.flush(session_id)
+    return {"session_id": session_id, "flushed": True}
+
+@app.get("/meeting/{session_id}/stream")
+async def stream_meeting(session_id: str):
+    """
+    Server-sent events: pushes the summary and action items each time a new block has been merged.
+    """
+    async def events():
+        version = -1
+        while True:
+            snapshot = summarizer.get(session_id)
+            if snapshot is not None and snapshot["version"] != version:
+                version = snapshot["version"]
+                yield f"data: {json.dumps(snapshot)}\n\n"
+            await asyncio.sleep(1)
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.get("/archive/search")
+def search_archive(q: str, limit: int = 20, offset: int = 0):
+    """
+    Where did we discuss X: transcript segments matching q, best match first.
+    """
+    require("archive", timeout=0)
+    limit, offset = clamp_page(limit, offset)
+    return {"query": q, "limit": limit, "offset": offset, "results": archive.search_segments(q, limit, offset)}
+
+@app.get("/archive/terms")
+def search_archive_terms(q: str, limit: int = 20, offset: int = 0):
+    """
+    All meetings mentioning term q, ranked by extracted-term and transcript matches.
+    """
+    require("archive", timeout=0)
+    limit, offset = clamp_page(limit, offset)
+    return {"query": q, "limit": limit, "offset": offset, "results": archive.search_meetings_by_term(q, limit, offset)}
+
+@app.get("/archive/meetings")
+def list_archived_meetings(limit: int = 20, offset: int = 0):
+    require("archive", timeout=0)
+    limit, offset = clamp_page(limit, offset)
+    return {"limit": limit, "offset": offset, "results": archive.list_meetings(limit, offset)}
+
+@app.get("/archive/meetings/{meeting_id}")
+def get_archived_meeting(meeting_id: str):
+    require("archive", timeout=0)
+    meeting = archive.get_meeting(meeting_id)
+    if meeting is None:
+        raise HTTPException(status_code=404, detail="Meeting not found.")
+    return meeting
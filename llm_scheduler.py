@@ -0,0 +1,322 @@
+import itertools
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from queue import PriorityQueue
+
+# Priorities (lower runs first)
+ACTIVE = 0       # live meetings waiting on the result
+BACKGROUND = 5   # rolling summaries of live meetings
+BACKFILL = 10    # catch-up and re-processing jobs
+
+# Content trigger defaults
+MIN_WORDS = 12        # fire at a sentence boundary once this many new words arrived
+MAX_WORDS = 80        # fire regardless of boundaries at this many words
+MIN_DELAY = 2.0       # seconds between calls for the same stream
+MAX_DELAY = 15.0      # never hold new text longer than this
+
+# Rate limits shared by every session in the process
+REQUESTS_PER_MINUTE = 30
+TOKENS_PER_MINUTE = 1_000_000
+DEFAULT_TOKENS = 1000  # per-request estimate when the caller gives none
+
+# Retries and hedging
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5    # seconds
+BACKOFF_CAP = 8.0
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 20
+LATENCY_HISTORY = 200
+
+# Matched by class name so google.api_core need not be imported here
+RETRYABLE_ERRORS = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+    "InternalServerError", "GatewayTimeout", "TimeoutError", "ConnectionError",
+}
+
+_SENTENCE_END = re.compile(r'[.!?]["\')\]]*$')
+
+
+class ContentTrigger:
+    """Decides when accumulated transcript text is worth an LLM call.
+
+    Fires on a sentence boundary once min_words new words have arrived, or
+    unconditionally at max_words or max_delay, but never sooner than min_delay
+    after the previous call.
+
+    Finished phrases are given to add(). The phrase still being transcribed
+    can be given to update_phrase() so it counts before it is finished; its
+    final text is still sent once added, since the transcriber may correct
+    earlier words.
+    """
+
+    def __init__(self, min_words=MIN_WORDS, max_words=MAX_WORDS, min_delay=MIN_DELAY, max_delay=MAX_DELAY):
+        self.min_words = min_words
+        self.max_words = max_words
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.pending = []
+        self.word_count = 0
+        self.first_at = None
+        self.last_fired = 0.0
+        self.phrase = ''  # latest hypothesis of the phrase in progress
+        self.phrase_sent = False  # that phrase was already sent early
+        self.lock = threading.Lock()
+
+    def add(self, text):
+        """Add a finished phrase. It replaces the in-progress hypothesis of the same phrase."""
+        text = (text or '').strip()
+        with self.lock:
+            self.phrase = ''
+            self.phrase_sent = False
+            if not text:
+                return
+            if self.first_at is None:
+                self.first_at = time.monotonic()
+            self.pending.append(text)
+            self.word_count += len(text.split())
+
+    def update_phrase(self, text):
+        """Replace the hypothesis of the phrase in progress with its latest full text."""
+        text = (text or '').strip()
+        with self.lock:
+            if self.phrase_sent:
+                return  # wait for the finished phrase
+            if text and self.first_at is None:
+                self.first_at = time.monotonic()
+            self.phrase = text
+
+    def poll(self):
+        """Return the pending text if a call should be made now, otherwise None."""
+        now = time.monotonic()
+        with self.lock:
+            parts = self._parts()
+            if not parts or now - self.last_fired < self.min_delay:
+                return None
+            word_count = self.word_count + len(self.phrase.split())
+            at_boundary = bool(_SENTENCE_END.search(parts[-1]))
+            if (word_count >= self.max_words
+                    or now - self.first_at >= self.max_delay
+                    or (word_count >= self.min_words and at_boundary)):
+                self.last_fired = now
+                return self._take()
+        return None
+
+    def flush(self):
+        """Return whatever is pending, ignoring thresholds."""
+        with self.lock:
+            return self._take() if self._parts() else None
+
+    def reset(self):
+        with self.lock:
+            self._take()
+            self.phrase_sent = False
+
+    def _parts(self):
+        # Called with the lock held
+        return self.pending + [self.phrase] if self.phrase else self.pending
+
+    def _take(self):
+        # Called with the lock held
+        text = ' '.join(self._parts())
+        if self.phrase:
+            self.phrase = ''
+            self.phrase_sent = True
+        self.pending = []
+        self.word_count = 0
+        self.first_at = None
+        return text
+
+
+class TokenBucket:
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1, block=True):
+        """Take amount tokens, waiting for them if block is True. Returns False if not blocking and short."""
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                self._refill(time.monotonic())
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return True
+                wait_seconds = (amount - self.tokens) / self.rate
+            if not block:
+                return False
+            time.sleep(wait_seconds)
+
+    def release(self, amount=1):
+        """Return tokens taken by acquire that were not used."""
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class SchedulerBusy(Exception):
+    """Raised by LLMScheduler.call when a job waited in the queue past its timeout."""
+
+
+class _Job:
+    def __init__(self, fn, session_id, priority, tokens):
+        self.fn = fn
+        self.session_id = session_id
+        self.priority = priority
+        self.tokens = tokens
+        self.attempt = 0
+        self.future = Future()
+
+
+class LLMScheduler:
+    """Runs LLM calls in priority order under shared request/token rate limits,
+    retrying transient errors with jittered backoff and hedging slow calls.
+
+    fn must be free of side effects: it may run more than once when retried
+    or hedged. Apply its result once, in the caller.
+    """
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE,
+                 max_workers=4, max_retries=MAX_RETRIES, hedge_percentile=HEDGE_PERCENTILE):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.hedge_percentile = hedge_percentile
+        self.queue = PriorityQueue()
+        self.counter = itertools.count()
+        self.priorities = {}  # session_id -> priority, for sessions not at the ACTIVE default
+        self.priority_lock = threading.Lock()
+        self.latencies = deque(maxlen=LATENCY_HISTORY)
+        self.latency_lock = threading.Lock()
+        # A job only leaves the priority queue once a worker is free, so
+        # queued work is always ordered by priority, never by arrival.
+        self.slots = threading.Semaphore(max_workers)
+        self.workers = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self.calls = ThreadPoolExecutor(max_workers=max_workers * 2, thread_name_prefix="llm-call")
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._dispatch, daemon=True)
+                self._thread.start()
+
+    def set_priority(self, session_id, priority):
+        """Set the priority used for session_id's jobs (e.g. BACKFILL for catch-up work)."""
+        with self.priority_lock:
+            self.priorities[session_id] = priority
+
+    def clear_priority(self, session_id):
+        with self.priority_lock:
+            self.priorities.pop(session_id, None)
+
+    def priority_of(self, session_id):
+        with self.priority_lock:
+            return self.priorities.get(session_id, ACTIVE)
+
+    def submit(self, fn, session_id=None, priority=None, tokens=DEFAULT_TOKENS):
+        """Queue fn() and return a Future for its result. priority defaults to the session's priority."""
+        self.start()
+        if priority is None:
+            priority = self.priority_of(session_id)
+        job = _Job(fn, session_id, priority, tokens)
+        self._enqueue(job)
+        return job.future
+
+    def call(self, fn, session_id=None, priority=None, tokens=DEFAULT_TOKENS, timeout=None):
+        """Run fn() through the scheduler and wait up to timeout seconds for its result.
+
+        Raises SchedulerBusy if the job was still queued at the timeout, or
+        concurrent.futures.TimeoutError if it had started but not finished.
+        """
+        future = self.submit(fn, session_id, priority, tokens)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                raise SchedulerBusy(f"LLM queue wait exceeded {timeout}s")
+            raise
+
+    def _enqueue(self, job):
+        self.queue.put((job.priority, next(self.counter), job))
+
+    def _dispatch(self):
+        while True:
+            self.slots.acquire()
+            self.requests.acquire(1)
+            _, _, job = self.queue.get()
+            if job.attempt == 0 and not job.future.set_running_or_notify_cancel():
+                self.requests.release(1)  # caller gave up; hand the request back
+                self.slots.release()
+                continue
+            self.tokens.acquire(job.tokens)
+            self.workers.submit(self._execute, job)
+
+    def _execute(self, job):
+        try:
+            result = self._hedged(job)
+        except Exception as e:
+            if job.attempt >= self.max_retries or type(e).__name__ not in RETRYABLE_ERRORS:
+                job.future.set_exception(e)
+                return
+            # Back off without holding a worker, then rejoin the queue at the job's priority
+            delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** job.attempt))
+            print(f"[LLM RETRY] {job.session_id}: {type(e).__name__}, retrying in {delay:.1f}s")
+            job.attempt += 1
+            timer = threading.Timer(delay, self._enqueue, args=(job,))
+            timer.daemon = True
+            timer.start()
+            return
+        else:
+            job.future.set_result(result)
+        finally:
+            self.slots.release()
+
+    def hedge_after(self):
+        """Latency (seconds) after which a duplicate request is sent, or None until enough samples exist."""
+        with self.latency_lock:
+            if len(self.latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile))]
+
+    def _timed(self, fn):
+        began = time.monotonic()
+        result = fn()
+        with self.latency_lock:
+            self.latencies.append(time.monotonic() - began)
+        return result
+
+    def _hedged(self, job):
+        primary = self.calls.submit(self._timed, job.fn)
+        threshold = self.hedge_after()
+        if threshold is None:
+            return primary.result()
+        done, _ = wait([primary], timeout=threshold)
+        # Hedge only if the rate limits have room right now
+        if done or not self.requests.acquire(1, block=False):
+            return primary.result()
+        if not self.tokens.acquire(job.tokens, block=False):
+            self.requests.release(1)
+            return primary.result()
+        hedge = self.calls.submit(self._timed, job.fn)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
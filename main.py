@@ -1,38 +1,55 @@
-import pyaudio
+import os
 import numpy as np
-import whisper
-import time
 import threading
 import queue
-import resampy
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 import uvicorn
+from utterance_packer import UtterancePacker
+from startup import Readiness
 
 # Parameters
 DEVICE_INDEX = 0  # Set to your Stereo Mix device index
-FORMAT = pyaudio.paInt16
 CHANNELS = 2      # Stereo Mix is usually stereo
 RATE = 44100      # Stereo Mix is usually 44100 Hz
 CHUNK = 1024
 TARGET_RATE = 16000
 SILENCE_THRESHOLD = 500  # Adjust as needed (RMS value)
 SILENCE_DURATION = 0.7   # seconds of silence to trigger transcription
-
-# Load Whisper model
-model = whisper.load_model("tiny.en")  # or "small", "medium", "large"
-
-# PyAudio setup
-p = pyaudio.PyAudio()
-stream = p.open(format=FORMAT,
-                channels=CHANNELS,
-                rate=RATE,
-                input=True,
-                input_device_index=DEVICE_INDEX,
-                frames_per_buffer=CHUNK)
+SHORT_WINDOW_SECONDS = 10.0  # audio (lone or packed) up to this long uses a reduced encoder window (None = always 30 s)
+PACK_MAX_WAIT = 0.25  # seconds a caption may wait for more utterances to share its window (0 = only those already queued)
+WHISPER_MODEL = "tiny.en"  # or "small", "medium", "large"
+RELOAD = os.getenv('MEETSIGHT_RELOAD') == '1'
+
+# The Whisper model and audio stream are brought up in the background by the
+# lifespan hook; /ready reports their progress.
+readiness = Readiness()
+running = threading.Event()
+model = None
+packer = None
+p = None
+stream = None
 
 audio_queue = queue.Queue()
 
+def init_whisper():
+    global model, packer
+    import whisper
+    model = whisper.load_model(WHISPER_MODEL)
+    packer = UtterancePacker(model, short_window_seconds=SHORT_WINDOW_SECONDS)
+
+def init_audio():
+    global p, stream
+    import pyaudio
+    p = pyaudio.PyAudio()
+    stream = p.open(format=pyaudio.paInt16,
+                    channels=CHANNELS,
+                    rate=RATE,
+                    input=True,
+                    input_device_index=DEVICE_INDEX,
+                    frames_per_buffer=CHUNK)
+
 # Helper: check if audio is silent
 def is_silent(audio_np, threshold=SILENCE_THRESHOLD):
     rms = np.sqrt(np.mean(np.square(audio_np)))
@@ -67,10 +84,13 @@ manager = ConnectionManager()
 
 # Audio recording thread
 def record_audio():
+    if not readiness.wait("audio"):
+        return
     buffer = []
     silent_chunks = 0
+    heard = False  # the buffer holds at least one chunk above the silence threshold
     silence_chunk_count = int(SILENCE_DURATION * RATE / CHUNK)
-    while True:
+    while running.is_set():
         data = stream.read(CHUNK, exception_on_overflow=False)
         buffer.append(data)
         audio_np = np.frombuffer(data, np.int16)
@@ -81,35 +101,68 @@ def record_audio():
             silent_chunks += 1
         else:
             silent_chunks = 0
+            heard = True
         if silent_chunks >= silence_chunk_count and len(buffer) > silence_chunk_count:
-            audio_queue.put(b''.join(buffer))
+            # Clips of pure room noise would only give Whisper something to hallucinate on
+            if heard:
+                audio_queue.put(b''.join(buffer))
             buffer = []
             silent_chunks = 0
+            heard = False
+
+# Helper: convert raw recorded bytes to 16 kHz float32 mono
+def to_model_audio(audio_bytes):
+    import resampy
+    audio_np = np.frombuffer(audio_bytes, np.int16)
+    if CHANNELS == 2:
+        audio_np = audio_np.reshape(-1, 2)
+        audio_np = audio_np.mean(axis=1)
+    audio_np = resampy.resample(audio_np, RATE, TARGET_RATE)
+    return audio_np.astype(np.float32) / 32768.0
 
 def transcribe_audio():
     import asyncio
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
+    if not readiness.wait("whisper"):
+        return
+    pending = None
     while True:
-        audio_bytes = audio_queue.get()
-        audio_np = np.frombuffer(audio_bytes, np.int16)
-        if CHANNELS == 2:
-            audio_np = audio_np.reshape(-1, 2)
-            audio_np = audio_np.mean(axis=1)
-        audio_np = resampy.resample(audio_np, RATE, TARGET_RATE)
-        audio_np = audio_np.astype(np.float32) / 32768.0
-        result = model.transcribe(audio_np, language="en", fp16=False)
-        text = result['text'].strip()
-        if text:
-            coro = manager.broadcast(text)
-            loop.run_until_complete(coro)
-
-# Start background threads
-threading.Thread(target=record_audio, daemon=True).start()
-threading.Thread(target=transcribe_audio, daemon=True).start()
+        # Wait briefly for more utterances so several share one Whisper window
+        utterances, pending = packer.gather(audio_queue, pending, convert=to_model_audio, max_wait=PACK_MAX_WAIT)
+        for text in packer.transcribe(utterances):
+            if text:
+                coro = manager.broadcast(text)
+                loop.run_until_complete(coro)
+
+@asynccontextmanager
+async def lifespan(app):
+    running.set()
+    readiness.run("whisper", init_whisper)
+    readiness.run("audio", init_audio)
+    recorder = threading.Thread(target=record_audio, daemon=True)
+    recorder.start()
+    threading.Thread(target=transcribe_audio, daemon=True).start()
+    yield
+    running.clear()
+    recorder.join(timeout=1.0)
+    if stream is not None:
+        stream.stop_stream()
+        stream.close()
+    if p is not None:
+        p.terminate()
 
 # FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+@app.get("/ready")
+def ready():
+    report = readiness.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -148,4 +201,5 @@ def get():
     """)
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8001, reload=True) 
\ No newline at end of file
+    # Passing the app object avoids importing this module a second time as "main"
+    uvicorn.run("main:app" if RELOAD else app, host="0.0.0.0", port=8001, reload=RELOAD) 
\ No newline at end of file
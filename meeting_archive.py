@@ -0,0 +1,233 @@
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from queue import Queue, Empty
+
+BATCH_SIZE = 200          # max queued writes committed in one transaction
+BATCH_INTERVAL = 1.0      # seconds to wait for more writes before committing
+MAX_PAGE_SIZE = 100
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meetings (
+    id TEXT PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    meeting_id TEXT NOT NULL REFERENCES meetings(id),
+    ts TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_meeting ON segments(meeting_id, ts);
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    meeting_id TEXT NOT NULL REFERENCES meetings(id),
+    ts TEXT NOT NULL,
+    term TEXT NOT NULL,
+    definition TEXT,
+    contextual_explanation TEXT,
+    example_quote TEXT,
+    difficulty INTEGER
+);
+CREATE INDEX IF NOT EXISTS terms_meeting ON terms(meeting_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+    text, content='segments', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS terms_fts USING fts5(
+    term, definition, contextual_explanation, content='terms', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN
+    INSERT INTO segments_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN
+    INSERT INTO segments_fts(segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS terms_ai AFTER INSERT ON terms BEGIN
+    INSERT INTO terms_fts(rowid, term, definition, contextual_explanation)
+    VALUES (new.id, new.term, new.definition, new.contextual_explanation);
+END;
+CREATE TRIGGER IF NOT EXISTS terms_ad AFTER DELETE ON terms BEGIN
+    INSERT INTO terms_fts(terms_fts, rowid, term, definition, contextual_explanation)
+    VALUES ('delete', old.id, old.term, old.definition, old.contextual_explanation);
+END;
+'''
+
+
+# Helper: turn free text into an FTS5 query of quoted tokens, so user input
+# can never be parsed as FTS syntax (AND/OR/NEAR, column filters, quotes...)
+def to_fts_query(text):
+    tokens = re.findall(r'\w+', text or '')
+    return ' '.join(f'"{t}"' for t in tokens)
+
+
+def clamp_page(limit, offset):
+    """Bound limit to 1..MAX_PAGE_SIZE and offset to >= 0, as every paged query does."""
+    return max(1, min(int(limit), MAX_PAGE_SIZE)), max(0, int(offset))
+
+
+class MeetingArchive:
+    def __init__(self, path):
+        self.path = path
+        self.queue = Queue()
+        self._local = threading.local()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @property
+    def conn(self):
+        # One read connection per thread (FastAPI runs sync endpoints in a pool)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # ---- writes: queued and committed in batches by a single writer thread ----
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def add_segment(self, meeting_id, text, ts=None):
+        if not meeting_id:
+            raise ValueError("meeting_id is required")
+        if text and text.strip():
+            self._put(('segment', meeting_id, ts or datetime.utcnow().isoformat(), text.strip()))
+
+    def add_terms(self, meeting_id, terms, ts=None):
+        if not meeting_id:
+            raise ValueError("meeting_id is required")
+        ts = ts or datetime.utcnow().isoformat()
+        for t in terms:
+            if t.get('term'):
+                self._put(('term', meeting_id, ts, t))
+
+    def _put(self, item):
+        self.start()
+        self.queue.put(item)
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + BATCH_INTERVAL
+            while len(batch) < BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except Empty:
+                    break
+            try:
+                with conn:
+                    self._write(conn, batch)
+            except sqlite3.Error as e:
+                # Fall back to one transaction per row so a bad row only loses itself
+                print(f"[ARCHIVE ERROR] batch of {len(batch)} failed, retrying row by row: {e}")
+                for item in batch:
+                    try:
+                        with conn:
+                            self._write(conn, [item])
+                    except sqlite3.Error as e:
+                        print(f"[ARCHIVE ERROR] dropped write for meeting {item[1]!r}: {e}")
+
+    def _write(self, conn, batch):
+        meetings = {}
+        for _, meeting_id, ts, _ in batch:
+            first, _ = meetings.get(meeting_id, (ts, ts))
+            meetings[meeting_id] = (min(first, ts), ts)
+        conn.executemany(
+            'INSERT INTO meetings(id, started_at, updated_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET updated_at = MAX(updated_at, excluded.updated_at)',
+            [(m, first, last) for m, (first, last) in meetings.items()],
+        )
+        conn.executemany(
+            'INSERT INTO segments(meeting_id, ts, text) VALUES (?, ?, ?)',
+            [(m, ts, text) for kind, m, ts, text in batch if kind == 'segment'],
+        )
+        conn.executemany(
+            'INSERT INTO terms(meeting_id, ts, term, definition, contextual_explanation, example_quote, difficulty) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(m, ts, t['term'], t.get('definition'), t.get('contextual_explanation'),
+              t.get('example_quote'), t.get('difficulty'))
+             for kind, m, ts, t in batch if kind == 'term'],
+        )
+
+    # ---- reads ----
+
+    def search_segments(self, query, limit=20, offset=0):
+        """Transcript segments matching query, best match first."""
+        fts_query = to_fts_query(query)
+        if not fts_query:
+            return []
+        limit, offset = clamp_page(limit, offset)
+        rows = self.conn.execute(
+            'SELECT s.id, s.meeting_id, s.ts, '
+            "snippet(segments_fts, 0, '[', ']', '...', 16) AS snippet, bm25(segments_fts) AS score "
+            'FROM segments_fts JOIN segments s ON s.id = segments_fts.rowid '
+            'WHERE segments_fts MATCH ? ORDER BY score LIMIT ? OFFSET ?',
+            (fts_query, limit, offset),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def search_meetings_by_term(self, query, limit=20, offset=0):
+        """Meetings mentioning query, either as an extracted term or in the transcript, best match first."""
+        fts_query = to_fts_query(query)
+        if not fts_query:
+            return []
+        limit, offset = clamp_page(limit, offset)
+        # bm25 is negative (lower is better); sum per meeting so more and
+        # better hits rank higher, and weight extracted terms above mentions.
+        rows = self.conn.execute(
+            'WITH hits AS ('
+            '  SELECT t.meeting_id, 2.0 * bm25(terms_fts, 10.0, 1.0, 1.0) AS score, 1 AS term_hit, 0 AS mention'
+            '  FROM terms_fts JOIN terms t ON t.id = terms_fts.rowid WHERE terms_fts MATCH ?'
+            '  UNION ALL'
+            '  SELECT s.meeting_id, bm25(segments_fts), 0, 1'
+            '  FROM segments_fts JOIN segments s ON s.id = segments_fts.rowid WHERE segments_fts MATCH ?'
+            ') '
+            'SELECT h.meeting_id, m.started_at, m.updated_at, SUM(h.score) AS score, '
+            'SUM(h.term_hit) AS term_hits, SUM(h.mention) AS mentions '
+            'FROM hits h JOIN meetings m ON m.id = h.meeting_id '
+            'GROUP BY h.meeting_id ORDER BY score LIMIT ? OFFSET ?',
+            (fts_query, fts_query, limit, offset),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def list_meetings(self, limit=20, offset=0):
+        limit, offset = clamp_page(limit, offset)
+        rows = self.conn.execute(
+            'SELECT id, started_at, updated_at FROM meetings ORDER BY updated_at DESC LIMIT ? OFFSET ?',
+            (limit, offset),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def get_meeting(self, meeting_id):
+        meeting = self.conn.execute(
+            'SELECT id, started_at, updated_at FROM meetings WHERE id = ?', (meeting_id,)
+        ).fetchone()
+        if meeting is None:
+            return None
+        segments = self.conn.execute(
+            'SELECT ts, text FROM segments WHERE meeting_id = ? ORDER BY ts, id', (meeting_id,)
+        ).fetchall()
+        terms = self.conn.execute(
+            'SELECT ts, term, definition, contextual_explanation, example_quote, difficulty '
+            'FROM terms WHERE meeting_id = ? ORDER BY ts, id', (meeting_id,)
+        ).fetchall()
+        return {**dict(meeting), "segments": [dict(r) for r in segments], "terms": [dict(r) for r in terms]}
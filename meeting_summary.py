@@ -0,0 +1,248 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+from pydantic import BaseModel, ValidationError
+from prompt_builder import MODEL_NAME, estimate_tokens
+from llm_scheduler import BACKGROUND, RETRYABLE_ERRORS
+
+BLOCK_WORDS = 300          # transcript words summarized per block
+IDLE_FLUSH_SECONDS = 20    # summarize a partial block after this long without new text
+SUMMARY_WORDS = 200        # target length of the running meeting summary
+RETRY_SECONDS = 5          # wait before retrying a block after a transient LLM error
+MAX_BLOCK_ATTEMPTS = 3     # give up on a block after this many failures
+SESSION_TTL_SECONDS = 2 * 60 * 60  # forget sessions unused for this long
+
+# Each block is summarized once and cached; the running summary is only ever
+# merged with the new block summaries, so the cost of an update does not grow
+# with the length of the meeting.
+BLOCK_INSTRUCTIONS = (
+    "You summarize one section of a meeting transcript. Return a short summary of the section and any action "
+    "items (tasks someone committed to or was asked to do). Only include action items stated in the section. "
+    "Use an empty list if there are none."
+)
+MERGE_INSTRUCTIONS = (
+    "You maintain a running summary of a meeting. Update the CURRENT SUMMARY with the NEW SECTIONS, keeping "
+    f"earlier points that still matter. Keep it under {SUMMARY_WORDS} words."
+)
+
+ACTION_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string", "description": "Short imperative title."},
+        "description": {"type": "string"},
+        "owner": {"type": "string", "description": "Person responsible, if mentioned."}
+    },
+    "required": ["title", "description"]
+}
+BLOCK_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "action_items": {"type": "array", "items": ACTION_ITEM_SCHEMA}
+    },
+    "required": ["summary", "action_items"]
+}
+MERGE_SCHEMA = {
+    "type": "object",
+    "properties": {"summary": {"type": "string"}},
+    "required": ["summary"]
+}
+
+
+class ActionItem(BaseModel):
+    title: str
+    description: str
+    owner: Optional[str] = None
+
+
+class BlockSummary(BaseModel):
+    summary: str
+    action_items: List[ActionItem]
+
+
+class MergedSummary(BaseModel):
+    summary: str
+
+
+def _json_model(instructions, schema):
+    import google.generativeai as genai
+    return genai.GenerativeModel(
+        MODEL_NAME,
+        system_instruction=instructions,
+        generation_config=genai.GenerationConfig(response_mime_type="application/json", response_schema=schema),
+    )
+
+
+class MeetingSession:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.pending_words = []
+        self.last_text_at = None
+        self.last_used_at = time.monotonic()
+        self.flush_requested = False
+        self.block_count = 0
+        self.summary = ''
+        self.action_items = OrderedDict()  # normalized title -> ActionItem
+        self.version = 0
+        self.retry_at = 0.0
+        self.block_attempts = 0  # failures of the block at the front of pending_words
+        self.dropped_blocks = 0
+
+    def snapshot(self):
+        return {
+            "session_id": self.session_id,
+            "summary": self.summary,
+            "action_items": [item.model_dump() for item in self.action_items.values()],
+            "blocks": self.block_count,
+            "dropped_blocks": self.dropped_blocks,
+            "version": self.version,
+        }
+
+
+class MeetingSummarizer:
+    def __init__(self, block_words=BLOCK_WORDS, idle_flush_seconds=IDLE_FLUSH_SECONDS, scheduler=None,
+                 session_ttl=SESSION_TTL_SECONDS):
+        self.block_words = block_words
+        self.idle_flush_seconds = idle_flush_seconds
+        self.scheduler = scheduler  # optional llm_scheduler.LLMScheduler for rate limits and retries
+        self.session_ttl = session_ttl
+        self.sessions = OrderedDict()  # served round-robin: a session moves to the end once served
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self._thread = None
+        self._block_model = None
+        self._merge_model = None
+
+    def start(self):
+        with self.lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def add_text(self, session_id, text):
+        words = text.split()
+        if not words:
+            return
+        self.start()
+        with self.changed:
+            session = self.sessions.setdefault(session_id, MeetingSession(session_id))
+            session.pending_words.extend(words)
+            session.last_text_at = session.last_used_at = time.monotonic()
+            self.changed.notify_all()
+
+    def flush(self, session_id):
+        """Summarize whatever is pending for session_id without waiting for a full block."""
+        with self.changed:
+            session = self.sessions.get(session_id)
+            if session is not None and session.pending_words:
+                session.flush_requested = True
+                self.changed.notify_all()
+
+    def reset(self, session_id):
+        with self.changed:
+            self.sessions.pop(session_id, None)
+
+    def get(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return None
+            session.last_used_at = time.monotonic()
+            return session.snapshot()
+
+    def expire(self):
+        """Drop sessions that have been neither written nor read for session_ttl seconds."""
+        cutoff = time.monotonic() - self.session_ttl
+        with self.lock:
+            for session_id in [k for k, v in self.sessions.items() if v.last_used_at < cutoff]:
+                del self.sessions[session_id]
+
+    def _take_block(self):
+        # Called with the lock held. Returns (session, words) or (None, None).
+        now = time.monotonic()
+        for session in list(self.sessions.values()):
+            if not session.pending_words or now < session.retry_at:
+                continue
+            idle = session.last_text_at is not None and now - session.last_text_at >= self.idle_flush_seconds
+            if len(session.pending_words) >= self.block_words or session.flush_requested or idle:
+                words = session.pending_words[:self.block_words]
+                del session.pending_words[:self.block_words]
+                if not session.pending_words:
+                    session.flush_requested = False
+                self.sessions.move_to_end(session.session_id)
+                return session, words
+        return None, None
+
+    def _run(self):
+        last_expiry = time.monotonic()
+        while True:
+            if time.monotonic() - last_expiry >= 60:
+                self.expire()
+                last_expiry = time.monotonic()
+            with self.changed:
+                session, words = self._take_block()
+                while session is None:
+                    self.changed.wait(timeout=1.0)
+                    session, words = self._take_block()
+                current_summary = session.summary
+            try:
+                text = ' '.join(words)
+                block = self._llm(session.session_id, text, lambda: self._summarize_block(text))
+                summary = block.summary
+                if current_summary:
+                    summary = self._llm(session.session_id, current_summary + block.summary,
+                                        lambda: self._merge(current_summary, block.summary))
+            except Exception as e:
+                # Malformed output or a rejected request fails the same way every
+                # time, so only transient errors are retried, and only a few times.
+                with self.changed:
+                    session.block_attempts += 1
+                    if type(e).__name__ in RETRYABLE_ERRORS and session.block_attempts < MAX_BLOCK_ATTEMPTS:
+                        session.pending_words[:0] = words
+                        session.retry_at = time.monotonic() + RETRY_SECONDS
+                        print(f"[SUMMARY ERROR] {session.session_id}: {e}, retrying")
+                    else:
+                        session.block_attempts = 0
+                        session.dropped_blocks += 1
+                        print(f"[SUMMARY ERROR] {session.session_id}: {e}, dropping block of {len(words)} words")
+                continue
+            with self.changed:
+                if self.sessions.get(session.session_id) is not session:
+                    continue  # reset while we were summarizing
+                session.block_count += 1
+                session.block_attempts = 0
+                session.summary = summary
+                for item in block.action_items:
+                    key = ' '.join(item.title.lower().split())
+                    session.action_items.setdefault(key, item)
+                session.version += 1
+                self.changed.notify_all()
+
+    def _llm(self, session_id, prompt_text, fn):
+        if self.scheduler is None:
+            return fn()
+        tokens = estimate_tokens(prompt_text) + SUMMARY_WORDS * 2
+        # Summaries run behind the session's own term extraction, and backfill sessions stay behind live ones
+        priority = self.scheduler.priority_of(session_id) + BACKGROUND
+        return self.scheduler.call(fn, session_id=session_id, priority=priority, tokens=tokens)
+
+    def _summarize_block(self, text):
+        if self._block_model is None:
+            self._block_model = _json_model(BLOCK_INSTRUCTIONS, BLOCK_SCHEMA)
+        response = self._block_model.generate_content(f"SECTION:\n{text}")
+        return BlockSummary.model_validate_json(response.text)
+
+    def _merge(self, current_summary, block_summary):
+        if not current_summary:
+            return block_summary
+        if self._merge_model is None:
+            self._merge_model = _json_model(MERGE_INSTRUCTIONS, MERGE_SCHEMA)
+        response = self._merge_model.generate_content(
+            f"CURRENT SUMMARY:\n{current_summary}\n\nNEW SECTIONS:\n{block_summary}"
+        )
+        try:
+            return MergedSummary.model_validate_json(response.text).summary
+        except ValidationError as e:
+            print(f"[LLM JSON ERROR] {e}\nRaw output: {response.text}")
+            raise
@@ -0,0 +1,197 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+from pydantic import BaseModel, ValidationError
+
+MODEL_NAME = 'gemini-2.0-flash'
+CONTEXT_TOKEN_BUDGET = 200       # max tokens of CONTEXT sent per call
+KNOWN_TERMS_TOKEN_BUDGET = 100   # max tokens spent listing already-known terms
+MAX_KNOWN_TERMS = 500            # per session
+SESSION_TTL_SECONDS = 2 * 60 * 60  # forget a session's known terms after this long unused
+
+# Declared once and passed to Gemini as its native response schema, instead of
+# being pasted into every prompt.
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "technical_terms": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "term": {"type": "string"},
+                    "definition": {"type": "string", "description": "Clear, concise definition."},
+                    "contextual_explanation": {"type": "string", "description": "How the term is meant in this text."},
+                    "example_quote": {"type": "string", "description": "Sentence from the text using the term."},
+                    "difficulty": {"type": "integer", "description": "1=easy, 4=very difficult."}
+                },
+                "required": ["term", "definition", "contextual_explanation", "difficulty"]
+            }
+        }
+    },
+    "required": ["technical_terms"]
+}
+
+
+class TechnicalTerm(BaseModel):
+    term: str
+    definition: str
+    contextual_explanation: str
+    example_quote: Optional[str] = None
+    difficulty: int
+
+
+class TechnicalTerms(BaseModel):
+    technical_terms: List[TechnicalTerm]
+
+
+# Rough token estimate (~4 characters per token for English)
+def estimate_tokens(text):
+    return (len(text) + 3) // 4
+
+
+def _split_sentences(text):
+    return [s.strip() for s in re.split(r'(?<=[.!?])\s+', text) if s.strip()]
+
+
+def trim_context(context, chunk, budget=CONTEXT_TOKEN_BUDGET):
+    """Drop the chunk and repeated sentences from context and keep its most recent part within budget."""
+    if not context:
+        return ''
+    context = context.strip()
+    chunk = (chunk or '').strip()
+    # The frontend's context window ends with the chunk itself
+    if chunk and context.endswith(chunk):
+        context = context[:-len(chunk)].strip()
+    seen = set()
+    sentences = []
+    for sentence in _split_sentences(context):
+        key = sentence.lower()
+        if key not in seen:
+            seen.add(key)
+            sentences.append(sentence)
+    kept = []
+    used = 0
+    for sentence in reversed(sentences):
+        cost = estimate_tokens(sentence) + 1
+        if used + cost > budget:
+            if not kept:
+                # A single long sentence: keep its tail
+                kept.append(sentence[-budget * 4:])
+            break
+        kept.append(sentence)
+        used += cost
+    return ' '.join(reversed(kept))
+
+
+class PromptBuilder:
+    def __init__(self, instructions, context_budget=CONTEXT_TOKEN_BUDGET,
+                 known_terms_budget=KNOWN_TERMS_TOKEN_BUDGET, model_name=MODEL_NAME,
+                 response_schema=RESPONSE_SCHEMA, result_model=TechnicalTerms):
+        # result_model must have a technical_terms list of items with a term field
+        self.instructions = instructions
+        self.response_schema = response_schema
+        self.result_model = result_model
+        self.context_budget = context_budget
+        self.known_terms_budget = known_terms_budget
+        self.model_name = model_name
+        self.known_terms = {}  # session_id -> OrderedDict of lowercased term -> None
+        self.last_used = {}  # session_id -> monotonic time of last use
+        self.lock = threading.Lock()
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            import google.generativeai as genai
+            self._model = genai.GenerativeModel(
+                self.model_name,
+                system_instruction=self.instructions,
+                generation_config=genai.GenerationConfig(
+                    response_mime_type="application/json",
+                    response_schema=self.response_schema,
+                ),
+            )
+        return self._model
+
+    def _known(self, session_id):
+        with self.lock:
+            if session_id in self.known_terms:
+                self.last_used[session_id] = time.monotonic()
+            return list(self.known_terms.get(session_id, {}))
+
+    def remember(self, session_id, terms):
+        if session_id is None:
+            return
+        with self.lock:
+            now = time.monotonic()
+            for stale in [k for k, t in self.last_used.items() if now - t > SESSION_TTL_SECONDS]:
+                self.known_terms.pop(stale, None)
+                self.last_used.pop(stale, None)
+            self.last_used[session_id] = now
+            known = self.known_terms.setdefault(session_id, OrderedDict())
+            for term in terms:
+                key = term.strip().lower()
+                known[key] = None
+                known.move_to_end(key)
+            while len(known) > MAX_KNOWN_TERMS:
+                known.popitem(last=False)
+
+    def forget(self, session_id):
+        with self.lock:
+            self.known_terms.pop(session_id, None)
+            self.last_used.pop(session_id, None)
+
+    def build(self, chunk, context=None, session_id=None):
+        """Build the per-call prompt: chunk, budgeted context and recently known terms to skip."""
+        parts = [f"CHUNK:\n{chunk.strip()}"]
+        context = trim_context(context, chunk, self.context_budget)
+        if context:
+            parts.append(f"CONTEXT:\n{context}")
+        skip = []
+        used = 0
+        for term in reversed(self._known(session_id)):
+            cost = estimate_tokens(term) + 1
+            if used + cost > self.known_terms_budget:
+                break
+            skip.append(term)
+            used += cost
+        if skip:
+            parts.append("ALREADY DEFINED (skip): " + ', '.join(skip))
+        return '\n\n'.join(parts)
+
+    def parse(self, response_text, session_id=None):
+        """Validate the JSON response in one pass and drop terms the session already knows."""
+        result = self.result_model.model_validate_json(response_text)
+        known = set(self._known(session_id))
+        fresh = []
+        for t in result.technical_terms:
+            key = t.term.strip().lower()
+            if key and key not in known:
+                known.add(key)
+                fresh.append(t)
+        self.remember(session_id, [t.term for t in fresh])
+        return self.result_model(technical_terms=fresh)
+
+    def generate(self, prompt):
+        """Send prompt to Gemini and return the raw response text. Free of side effects, so safe to retry or hedge."""
+        return self.model.generate_content(prompt).text
+
+    def extract(self, chunk, context=None, session_id=None, call=None):
+        """Call Gemini for chunk and return a result_model instance. Raises ValidationError on malformed output.
+
+        call, if given, runs the network request (e.g. through llm_scheduler);
+        the response is parsed and its terms remembered once, here.
+        """
+        if not chunk or not chunk.strip():
+            return self.result_model(technical_terms=[])
+        prompt = self.build(chunk, context, session_id)
+        request = lambda: self.generate(prompt)
+        text = call(request) if call is not None else request()
+        try:
+            return self.parse(text, session_id)
+        except ValidationError as e:
+            print(f"[LLM JSON ERROR] {e}\nRaw output: {text}")
+            raise
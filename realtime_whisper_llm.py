@@ -11,7 +11,10 @@ from sys import platform
 import google.generativeai as genai
 from dotenv import load_dotenv
 import json
-import re
+from typing import List, Optional
+from pydantic import BaseModel, ValidationError
+from prompt_builder import PromptBuilder, estimate_tokens
+from llm_scheduler import LLMScheduler, ContentTrigger
 
 load_dotenv()
 
@@ -22,77 +25,66 @@ ENERGY_THRESHOLD = 1000
 RECORD_TIMEOUT = 2.0  # seconds
 PHRASE_TIMEOUT = 3.0  # seconds
 DEFAULT_MICROPHONE_NAME = "pulse" if 'linux' in platform else None
-LLM_INTERVAL = 15  # seconds
 LLM_OUTPUT_FILE = "llm_definitions.jsonl"
 # ==================================
 
 genai.configure(api_key=GEMINI_API_KEY)
 
-def get_gemini_definitions(text):
-    schema = '''
-    {
-      "type": "object",
-      "properties": {
+TERMS_INSTRUCTIONS = (
+    "Extract all technical terms from the CHUNK and provide their definitions and context, "
+    "tailored for a non-technical audience. Do not repeat ALREADY DEFINED terms. "
+    "If there are no terms, return an empty list for 'technical_terms'."
+)
+# This script's audience is non-technical, so terms carry no difficulty rating
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
         "technical_terms": {
-          "type": "array",
-          "description": "A list of all technical terms mentioned in the transcript, along with definitions and contextual explanations.",
-          "items": {
-            "type": "object",
-            "properties": {
-              "term": {"type": "string", "description": "The technical term or jargon identified in the transcript."},
-              "definition": {"type": "string", "description": "A clear and concise definition of the technical term."},
-              "contextual_explanation": {"type": "string", "description": "An explanation of how the term is used or meant within the current transcript, tailored for a non-technical audience."},
-              "example_quote": {"type": "string", "description": "A direct quote or sentence from the transcript where the term appears."}
-            },
-            "required": ["term", "definition", "contextual_explanation"]
-          }
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "term": {"type": "string"},
+                    "definition": {"type": "string", "description": "Clear, concise definition."},
+                    "contextual_explanation": {"type": "string", "description": "How the term is meant in this text, for a non-technical audience."},
+                    "example_quote": {"type": "string", "description": "Sentence from the text using the term."}
+                },
+                "required": ["term", "definition", "contextual_explanation"]
+            }
         }
-      },
-      "required": ["technical_terms"]
-    }
-    '''
-    prompt = (
-        "Extract all technical terms from the following text and provide their definitions and context. "
-        "Return the result as a JSON object matching this schema (if no terms, use an empty list for 'technical_terms'):\n" + schema + "\nText:\n" + text
-    )
-    model = genai.GenerativeModel('gemini-2.0-flash')
-    response = model.generate_content(prompt)
-    # Try to extract JSON from the response
-    match = re.search(r'\{[\s\S]*\}', response.text)
-    if match:
-        json_str = match.group(0)
-        try:
-            return json.loads(json_str)
-        except Exception as e:
-            print(f"[LLM JSON ERROR] {e}\nRaw output: {json_str}")
-            return None
-    else:
-        print(f"[LLM NO JSON FOUND] Raw output: {response.text}")
-        return None
+    },
+    "required": ["technical_terms"]
+}
 
-class TranscriptionBuffer:
-    def __init__(self):
-        self.buffer = []  # List of (timestamp, text) tuples
-        self.lock = threading.Lock()
+class Term(BaseModel):
+    term: str
+    definition: str
+    contextual_explanation: str
+    example_quote: Optional[str] = None
 
-    def add(self, text):
-        with self.lock:
-            self.buffer.append((datetime.utcnow(), text))
-            # Remove anything older than 30 seconds for safety
-            cutoff = datetime.utcnow() - timedelta(seconds=30)
-            self.buffer = [(ts, t) for ts, t in self.buffer if ts >= cutoff]
+class Terms(BaseModel):
+    technical_terms: List[Term]
 
-    def get_last_n_seconds(self, seconds=15):
-        with self.lock:
-            cutoff = datetime.utcnow() - timedelta(seconds=seconds)
-            return ' '.join([t for ts, t in self.buffer if ts >= cutoff])
+prompt_builder = PromptBuilder(TERMS_INSTRUCTIONS, response_schema=RESPONSE_SCHEMA, result_model=Terms)
+scheduler = LLMScheduler()
+
+def get_gemini_definitions(text):
+    try:
+        call = lambda request: scheduler.call(request, session_id="cli", tokens=estimate_tokens(text) + 500)
+        return prompt_builder.extract(text, session_id="cli", call=call).model_dump()
+    except ValidationError:
+        return None
 
-def llm_background_worker(buffer: TranscriptionBuffer):
+def llm_background_worker(trigger: ContentTrigger):
     while True:
-        time.sleep(LLM_INTERVAL)
-        recent_text = buffer.get_last_n_seconds(LLM_INTERVAL)
-        if recent_text.strip():
-            definitions = get_gemini_definitions(recent_text)
+        time.sleep(0.25)
+        recent_text = trigger.poll()
+        if recent_text:
+            try:
+                definitions = get_gemini_definitions(recent_text)
+            except Exception as e:
+                print(f"[LLM ERROR] {e}")
+                continue
             if definitions:
                 with open(LLM_OUTPUT_FILE, 'a', encoding='utf-8') as f:
                     f.write(json.dumps({
@@ -126,7 +118,7 @@ def main():
     audio_model = whisper.load_model(model)
 
     transcription = ['']
-    buffer = TranscriptionBuffer()
+    trigger = ContentTrigger()
 
     with source:
         recorder.adjust_for_ambient_noise(source)
@@ -140,7 +132,7 @@ def main():
     print("Model loaded.\n")
 
     # Start LLM background thread
-    threading.Thread(target=llm_background_worker, args=(buffer,), daemon=True).start()
+    threading.Thread(target=llm_background_worker, args=(trigger,), daemon=True).start()
 
     while True:
         try:
@@ -158,10 +150,12 @@ def main():
                 result = audio_model.transcribe(audio_np, fp16=torch.cuda.is_available())
                 text = result['text'].strip()
                 if phrase_complete:
+                    # The previous phrase is final now that a new one started
+                    trigger.add(transcription[-1])
                     transcription.append(text)
                 else:
                     transcription[-1] = text
-                buffer.add(text)
+                trigger.update_phrase(text)
                 os.system('cls' if os.name == 'nt' else 'clear')
                 for line in transcription:
                     print(line)
@@ -0,0 +1,127 @@
+import argparse
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+# Subsystem states reported by /ready
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class Readiness:
+    """Tracks heavy subsystems that are initialized in the background after the server starts."""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.subsystems = {}  # name -> dict(state, error, load_seconds, time_to_ready)
+        self.events = {}
+        self.optional = set()  # reported, but not needed for the service to be ready
+        self.lock = threading.Lock()
+
+    def register(self, name, required=True):
+        """Add subsystem name to the report. Only required subsystems gate readiness."""
+        with self.lock:
+            if not required:
+                self.optional.add(name)
+            self.subsystems.setdefault(name, {"state": PENDING, "error": None, "load_seconds": None, "time_to_ready": None})
+            self.events.setdefault(name, threading.Event())
+
+    def run(self, name, fn, background=True):
+        """Run fn() to bring up subsystem name, in a daemon thread unless background is False.
+
+        Does nothing if name is already loading or loaded.
+        """
+        self.register(name)
+        with self.lock:
+            if self.subsystems[name]["state"] != PENDING:
+                return
+            self.subsystems[name]["state"] = LOADING
+        if background:
+            threading.Thread(target=self._load, args=(name, fn), daemon=True, name=f"init-{name}").start()
+        else:
+            self._load(name, fn)
+
+    def _load(self, name, fn):
+        began = time.monotonic()
+        try:
+            fn()
+        except Exception as e:
+            traceback.print_exc()
+            self._set(name, state=FAILED, error=f"{type(e).__name__}: {e}")
+        else:
+            now = time.monotonic()
+            self._set(name, state=READY, load_seconds=round(now - began, 3),
+                      time_to_ready=round(now - self.started_at, 3))
+        self.events[name].set()
+
+    def _set(self, name, **fields):
+        with self.lock:
+            self.subsystems[name].update(fields)
+
+    def state(self, name):
+        with self.lock:
+            return self.subsystems.get(name, {}).get("state", PENDING)
+
+    def wait(self, name, timeout=None):
+        """Block until subsystem name has finished loading. Returns True if it is ready."""
+        self.register(name)
+        self.events[name].wait(timeout)
+        return self.state(name) == READY
+
+    def report(self):
+        with self.lock:
+            subsystems = {name: dict(info, required=name not in self.optional)
+                          for name, info in self.subsystems.items()}
+        ready = all(info["state"] == READY for info in subsystems.values() if info["required"])
+        return {
+            "ready": ready,
+            "uptime_seconds": round(time.monotonic() - self.started_at, 3),
+            "subsystems": subsystems,
+        }
+
+
+def profile_imports(module, top=20):
+    """Import module in a fresh interpreter with -X importtime and return the slowest imports.
+
+    Returns a list of (cumulative_us, self_us, name) sorted by cumulative time.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup tooling.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    profile = sub.add_parser("profile-imports", help="Show the slowest imports of a module.")
+    profile.add_argument("module", nargs="?", default="backend")
+    profile.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "profile-imports":
+        try:
+            rows = profile_imports(args.module, args.top)
+        except RuntimeError as e:
+            sys.exit(f"import {args.module} failed: {e}")
+        print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for cumulative_us, self_us, name in rows:
+            print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import pytest
+
+import llm_scheduler
+from llm_scheduler import ACTIVE, BACKFILL, ContentTrigger, LLMScheduler, SchedulerBusy
+
+
+def fast_scheduler(**kwargs):
+    return LLMScheduler(requests_per_minute=60000, tokens_per_minute=10**9, **kwargs)
+
+
+class ResourceExhausted(Exception):
+    pass
+
+
+def test_active_job_overtakes_queued_backfill():
+    scheduler = fast_scheduler(max_workers=2)
+    finished = []
+    lock = threading.Lock()
+
+    def job(name):
+        def run():
+            time.sleep(0.05)
+            with lock:
+                finished.append(name)
+        return run
+
+    futures = [scheduler.submit(job(f"backfill-{i}"), priority=BACKFILL) for i in range(8)]
+    futures.append(scheduler.submit(job("active"), priority=ACTIVE))
+    for future in futures:
+        future.result(timeout=5)
+    # At most the two backfill jobs already running finish first
+    assert finished.index("active") <= 2
+
+
+def test_session_priority_is_used_by_default():
+    scheduler = fast_scheduler()
+    assert scheduler.priority_of("s") == ACTIVE
+    scheduler.set_priority("s", BACKFILL)
+    assert scheduler.priority_of("s") == BACKFILL
+    scheduler.clear_priority("s")
+    assert scheduler.priority_of("s") == ACTIVE
+
+
+def test_retries_transient_errors(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "BACKOFF_BASE", 0.01)
+    scheduler = fast_scheduler()
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ResourceExhausted("quota")
+        return "ok"
+
+    assert scheduler.call(flaky, timeout=5) == "ok"
+    assert len(attempts) == 3
+
+
+def test_other_errors_are_not_retried():
+    scheduler = fast_scheduler()
+    attempts = []
+
+    def broken():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        scheduler.call(broken, timeout=5)
+    assert len(attempts) == 1
+
+
+def test_slow_call_is_hedged():
+    scheduler = fast_scheduler()
+    scheduler.latencies.extend([0.01] * llm_scheduler.HEDGE_MIN_SAMPLES)
+    calls = []
+
+    def request():
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(1.0)
+            return "slow"
+        return "fast"
+
+    began = time.monotonic()
+    assert scheduler.call(request, timeout=5) == "fast"
+    assert time.monotonic() - began < 0.5
+    assert len(calls) == 2
+
+
+def test_call_timeout_while_queued_raises_busy():
+    scheduler = fast_scheduler(max_workers=1)
+    release = threading.Event()
+    ran = []
+    blocker = scheduler.submit(release.wait)
+    with pytest.raises(SchedulerBusy):
+        scheduler.call(lambda: ran.append(1), timeout=0.1)
+    release.set()
+    blocker.result(timeout=5)
+    time.sleep(0.1)
+    assert ran == []
+
+
+def test_call_timeout_while_running():
+    scheduler = fast_scheduler()
+    release = threading.Event()
+    with pytest.raises(FutureTimeoutError):
+        scheduler.call(release.wait, timeout=0.1)
+    release.set()
+
+
+def test_phrase_hypothesis_is_replaced_not_appended():
+    trigger = ContentTrigger()
+    trigger.update_phrase("we use cough ka")
+    trigger.update_phrase("we use Kafka for streaming.")
+    assert trigger.flush() == "we use Kafka for streaming."
+
+
+def test_finished_phrase_is_sent_after_early_hypothesis():
+    trigger = ContentTrigger(min_words=100, max_words=4, min_delay=0)
+    trigger.add("first phrase")
+    trigger.update_phrase("we use cough ka")
+    assert trigger.poll() == "first phrase we use cough ka"
+    trigger.update_phrase("we use cough ka for")  # already sent; wait for the final text
+    assert trigger.flush() is None
+    trigger.add("we use Kafka for streaming.")
+    assert trigger.flush() == "we use Kafka for streaming."
+
+
+def test_trigger_fires_after_max_delay():
+    trigger = ContentTrigger(min_words=100, max_words=1000, min_delay=0, max_delay=0.05)
+    trigger.add("hello")
+    assert trigger.poll() is None
+    time.sleep(0.06)
+    assert trigger.poll() == "hello"
+    assert trigger.poll() is None
+
+
+def test_hedge_returns_request_token_when_tokens_are_short():
+    scheduler = LLMScheduler(requests_per_minute=60, tokens_per_minute=100)
+    scheduler.latencies.extend([0.01] * llm_scheduler.HEDGE_MIN_SAMPLES)
+
+    def request():
+        time.sleep(0.1)
+        return "ok"
+
+    # The call takes 60 of the 100 tokens, so the hedge can't get its 60
+    assert scheduler.call(request, tokens=60, timeout=5) == "ok"
+    # One request for the call and one the idle dispatcher holds for the next job
+    assert scheduler.requests.tokens >= 58 - 1e-6
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+import meeting_archive
+from meeting_archive import MAX_PAGE_SIZE, MeetingArchive, clamp_page
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(meeting_archive, 'BATCH_INTERVAL', 0.05)
+    return MeetingArchive(str(tmp_path / 'meetings.db'))
+
+
+def wait_for(fn, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = fn()
+        if result:
+            return result
+        time.sleep(0.02)
+    return fn()
+
+
+def test_search_segments_and_terms(archive):
+    archive.add_segment('m1', 'We should add idempotency keys to the payment API.')
+    archive.add_segment('m2', 'Lunch plans for Friday.')
+    archive.add_terms('m2', [{'term': 'Idempotency key', 'definition': 'A unique request key', 'difficulty': 3}])
+    hits = wait_for(lambda: archive.search_segments('idempotency'))
+    assert [h['meeting_id'] for h in hits] == ['m1']
+    assert '[idempotency]' in hits[0]['snippet']
+    meetings = wait_for(lambda: len(archive.search_meetings_by_term('idempotency')) == 2
+                        and archive.search_meetings_by_term('idempotency'))
+    assert meetings[0]['meeting_id'] == 'm2'
+
+
+def test_fts_syntax_in_query_is_literal(archive):
+    archive.add_segment('m1', 'near the kafka cluster')
+    assert wait_for(lambda: archive.search_segments('kafka'))
+    assert archive.search_segments('kafka" OR NEAR(') == []
+    assert archive.search_segments('"') == []
+
+
+def test_meeting_id_is_required(archive):
+    with pytest.raises(ValueError):
+        archive.add_segment(None, 'text')
+    with pytest.raises(ValueError):
+        archive.add_terms('', [{'term': 'x'}])
+
+
+def test_bad_row_does_not_drop_batch(archive):
+    archive.add_segment('m1', 'first good row')
+    archive._put(('segment', None, '2026-01-01T00:00:00', 'bad row'))
+    archive.add_segment('m2', 'second good row')
+    hits = wait_for(lambda: len(archive.search_segments('good')) == 2 and archive.search_segments('good'))
+    assert sorted(h['meeting_id'] for h in hits) == ['m1', 'm2']
+
+
+def test_pagination(archive):
+    for i in range(5):
+        archive.add_segment(f'm{i}', f'standup number {i}')
+    assert wait_for(lambda: len(archive.list_meetings()) == 5)
+    first = archive.search_segments('standup', limit=2)
+    second = archive.search_segments('standup', limit=2, offset=2)
+    assert len(first) == 2 and len(second) == 2
+    assert not {h['id'] for h in first} & {h['id'] for h in second}
+
+
+def test_clamp_page():
+    assert clamp_page(0, -5) == (1, 0)
+    assert clamp_page(500, 40) == (MAX_PAGE_SIZE, 40)
@@ -0,0 +1,100 @@
+import time
+
+import meeting_summary
+from meeting_summary import BlockSummary, MeetingSummarizer
+
+
+class FakeSummarizer(MeetingSummarizer):
+    """Summarizes without calling Gemini and records the order blocks were served in."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.served = []
+
+    def _summarize_block(self, text):
+        self.served.append(text.split()[0])
+        return BlockSummary(summary=text, action_items=[])
+
+    def _merge(self, current_summary, block_summary):
+        return current_summary + ' | ' + block_summary
+
+
+def test_blocks_are_served_round_robin():
+    summarizer = FakeSummarizer(block_words=2)
+    summarizer.start = lambda: None  # take blocks by hand, no worker thread
+    summarizer.add_text('a', 'a1 x a2 x a3 x')
+    summarizer.add_text('b', 'b1 x')
+    with summarizer.lock:
+        order = []
+        for _ in range(4):
+            session, words = summarizer._take_block()
+            if session is None:
+                break
+            order.append(words[0])
+    assert order == ['a1', 'b1', 'a2', 'a3']
+
+
+class ResourceExhausted(Exception):
+    pass
+
+
+def wait_for(summarizer, session_id, predicate, timeout=2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and not predicate(summarizer.get(session_id) or {}):
+        time.sleep(0.01)
+    return summarizer.get(session_id)
+
+
+def test_block_count_and_summary():
+    summarizer = FakeSummarizer(block_words=3)
+    summarizer.add_text('s', 'one two three four five six')
+    deadline = time.monotonic() + 2
+    while time.monotonic() < deadline and (summarizer.get('s') or {}).get('blocks') != 2:
+        time.sleep(0.01)
+    snapshot = summarizer.get('s')
+    assert snapshot['blocks'] == 2
+    assert snapshot['summary'] == 'one two three | four five six'
+
+
+def test_idle_sessions_expire():
+    summarizer = FakeSummarizer(session_ttl=0.05)
+    summarizer.add_text('old', 'word')
+    time.sleep(0.1)
+    summarizer.add_text('new', 'word')
+    summarizer.expire()
+    assert summarizer.get('old') is None
+    assert summarizer.get('new') is not None
+
+
+def test_failing_block_is_dropped_not_retried_forever():
+    summarizer = FakeSummarizer(block_words=2)
+    summarize = summarizer._summarize_block
+
+    def summarize_block(text):
+        if text.startswith('bad'):
+            summarizer.served.append('bad')
+            raise ValueError('malformed response')
+        return summarize(text)
+
+    summarizer._summarize_block = summarize_block
+    summarizer.add_text('s', 'bad x good x')
+    snapshot = wait_for(summarizer, 's', lambda s: s.get('blocks') == 1)
+    assert snapshot['summary'] == 'good x'
+    assert snapshot['dropped_blocks'] == 1
+    assert summarizer.served == ['bad', 'good']
+
+
+def test_transient_errors_are_retried_a_few_times(monkeypatch):
+    monkeypatch.setattr(meeting_summary, 'RETRY_SECONDS', 0)
+    summarizer = FakeSummarizer(block_words=2)
+    attempts = []
+
+    def summarize_block(text):
+        attempts.append(text)
+        raise ResourceExhausted('quota')
+
+    summarizer._summarize_block = summarize_block
+    summarizer.add_text('s', 'one two')
+    snapshot = wait_for(summarizer, 's', lambda s: s.get('dropped_blocks') == 1)
+    assert snapshot['dropped_blocks'] == 1
+    assert len(attempts) == meeting_summary.MAX_BLOCK_ATTEMPTS
@@ -0,0 +1,30 @@
+import pytest
+from pydantic import ValidationError
+
+from prompt_builder import PromptBuilder, trim_context
+
+
+def term(name, difficulty=2):
+    return ('{"term": "%s", "definition": "d", "contextual_explanation": "c", "difficulty": %d}'
+            % (name, difficulty))
+
+
+def test_difficulty_is_required():
+    builder = PromptBuilder("instructions")
+    with pytest.raises(ValidationError):
+        builder.parse('{"technical_terms": [{"term": "a", "definition": "d", "contextual_explanation": "c"}]}')
+
+
+def test_known_terms_are_filtered_and_listed():
+    builder = PromptBuilder("instructions")
+    first = builder.parse('{"technical_terms": [%s]}' % term("Kafka"), session_id="s")
+    assert [t.term for t in first.technical_terms] == ["Kafka"]
+    second = builder.parse('{"technical_terms": [%s, %s]}' % (term("kafka"), term("Raft")), session_id="s")
+    assert [t.term for t in second.technical_terms] == ["Raft"]
+    assert "ALREADY DEFINED (skip): raft, kafka" in builder.build("chunk", session_id="s")
+
+
+def test_trim_context_drops_chunk_and_repeats():
+    context = "Hello there. We use Kafka. Hello there. Then the chunk."
+    assert trim_context(context, "Then the chunk.", budget=200) == "Hello there. We use Kafka."
+    assert trim_context(context, "Then the chunk.", budget=5) == "We use Kafka."
@@ -0,0 +1,29 @@
+from startup import FAILED, READY, Readiness
+
+
+def test_optional_subsystem_does_not_gate_ready():
+    readiness = Readiness()
+    readiness.run("archive", lambda: None, background=False)
+    readiness.register("whisper", required=False)
+    report = readiness.report()
+    assert report["ready"] is True
+    assert report["subsystems"]["whisper"]["required"] is False
+
+
+def test_failed_required_subsystem_is_not_ready():
+    def broken():
+        raise RuntimeError("no model")
+
+    readiness = Readiness()
+    readiness.run("gemini", broken, background=False)
+    assert readiness.state("gemini") == FAILED
+    assert readiness.report()["ready"] is False
+
+
+def test_optional_subsystem_can_be_loaded_later():
+    readiness = Readiness()
+    readiness.register("whisper", required=False)
+    readiness.run("whisper", lambda: None, background=False)
+    assert readiness.wait("whisper", timeout=1)
+    assert readiness.state("whisper") == READY
+    assert readiness.report()["subsystems"]["whisper"]["required"] is False
@@ -0,0 +1,169 @@
+import queue
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from utterance_packer import UtterancePacker, SAMPLE_RATE, N_AUDIO_CTX
+
+
+def seconds(n):
+    return np.zeros(int(n * SAMPLE_RATE), dtype=np.float32)
+
+
+class FakeMel:
+    def __init__(self, n_frames):
+        self.n_frames = n_frames
+
+    def to(self, device):
+        return self
+
+
+class FakeEncoder:
+    def __init__(self):
+        self.positional_embedding = np.zeros((N_AUDIO_CTX, 4))
+
+
+class FakeModel:
+    is_multilingual = False
+    device = 'cpu'
+    dims = types.SimpleNamespace(n_mels=80)
+
+    def __init__(self):
+        self.encoder = FakeEncoder()
+        self.transcribe_calls = 0
+
+    def transcribe(self, audio_np, **kwargs):
+        self.transcribe_calls += 1
+        return {'text': ' full', 'segments': []}
+
+
+TIMESTAMP_BEGIN = 1000
+
+
+@pytest.fixture
+def fake_whisper(monkeypatch):
+    """Minimal stand-in for the whisper decode API used by the reduced-window path."""
+    decoded = []
+    mel_samples = []
+    speech = types.SimpleNamespace(no_speech_prob=0.01, avg_logprob=-0.2)
+
+    def decode(model, mel, options):
+        decoded.append((mel.n_frames, model.encoder.positional_embedding.shape[0], options))
+        # " one" from 0.00-0.60 s, " two" from 1.10-1.80 s
+        tokens = [TIMESTAMP_BEGIN, 1, TIMESTAMP_BEGIN + 30, TIMESTAMP_BEGIN + 55, 2, TIMESTAMP_BEGIN + 90]
+        return types.SimpleNamespace(text=' one two', tokens=tokens,
+                                     no_speech_prob=speech.no_speech_prob, avg_logprob=speech.avg_logprob)
+
+    tokenizer = types.SimpleNamespace(timestamp_begin=TIMESTAMP_BEGIN,
+                                      decode=lambda toks: ''.join({1: ' one', 2: ' two'}[t] for t in toks))
+
+    def log_mel_spectrogram(audio, n_mels):
+        mel_samples.append(len(audio))
+        return FakeMel(len(audio) // 160)
+
+    whisper = types.ModuleType('whisper')
+    whisper.log_mel_spectrogram = log_mel_spectrogram
+    whisper.pad_or_trim = lambda mel, n: FakeMel(n)
+    whisper.DecodingOptions = lambda **kwargs: kwargs
+    whisper.decode = decode
+    whisper_tokenizer = types.ModuleType('whisper.tokenizer')
+    whisper_tokenizer.get_tokenizer = lambda *args, **kwargs: tokenizer
+    monkeypatch.setitem(sys.modules, 'whisper', whisper)
+    monkeypatch.setitem(sys.modules, 'whisper.tokenizer', whisper_tokenizer)
+    return types.SimpleNamespace(decoded=decoded, mel_samples=mel_samples, speech=speech)
+
+
+def test_short_window_must_fit_in_full_window():
+    with pytest.raises(ValueError):
+        UtterancePacker(FakeModel(), short_window_seconds=31)
+    with pytest.raises(ValueError):
+        UtterancePacker(FakeModel(), short_window_seconds=0)
+
+
+def test_short_window_frames_rounds_up_and_is_bounded():
+    packer = UtterancePacker(FakeModel(), short_window_seconds=10)
+    assert packer.short_window_frames(int(1.2 * SAMPLE_RATE)) == 200
+    assert packer.short_window_frames(1) == 100
+    assert packer.short_window_frames(60 * SAMPLE_RATE) == N_AUDIO_CTX * 2
+
+
+def test_gather_waits_for_queued_utterances():
+    source = queue.Queue()
+    for n in (1, 2, 3):
+        source.put(seconds(n))
+    packer = UtterancePacker(FakeModel())
+    utterances, pending = packer.gather(source, max_wait=0.1, target_seconds=5)
+    assert [len(u) for u in utterances] == [SAMPLE_RATE, 2 * SAMPLE_RATE, 3 * SAMPLE_RATE]
+    assert pending is None
+
+
+def test_gather_without_wait_takes_only_queued_utterances():
+    source = queue.Queue()
+    source.put(seconds(1))
+    source.put(seconds(1))
+    packer = UtterancePacker(FakeModel())
+    utterances, pending = packer.gather(source, max_wait=0, target_seconds=5)
+    assert len(utterances) == 2
+    assert source.empty()
+
+
+def test_gather_returns_utterance_that_does_not_fit():
+    source = queue.Queue()
+    source.put(seconds(20))
+    source.put(seconds(15))
+    packer = UtterancePacker(FakeModel())
+    utterances, pending = packer.gather(source, max_wait=0.1, target_seconds=25)
+    assert len(utterances) == 1
+    assert len(pending) == 15 * SAMPLE_RATE
+
+
+def test_split_assigns_words_by_timestamp():
+    packer = UtterancePacker(FakeModel(), gap_seconds=0.5)
+    _, spans = packer.pack([seconds(1), seconds(1)])
+    segments = [{'text': '', 'start': 0.0, 'end': 2.5, 'words': [
+        {'word': ' hello', 'start': 0.1, 'end': 0.6},
+        {'word': ' there', 'start': 1.6, 'end': 2.2},
+    ]}]
+    assert packer._split(segments, spans) == ['hello', 'there']
+
+
+def test_reduced_window_restores_positional_embedding(fake_whisper):
+    model = FakeModel()
+    packer = UtterancePacker(model, short_window_seconds=10)
+    assert packer.transcribe([seconds(2)]) == ['one two']
+    n_frames, n_ctx, options = fake_whisper.decoded[0]
+    assert (n_frames, n_ctx) == (200, 100)
+    assert options['without_timestamps'] is True
+    assert model.encoder.positional_embedding.shape[0] == N_AUDIO_CTX
+    assert model.transcribe_calls == 0
+
+
+def test_packed_reduced_window_splits_on_segment_timestamps(fake_whisper):
+    model = FakeModel()
+    packer = UtterancePacker(model, gap_seconds=0.5, short_window_seconds=10)
+    assert packer.transcribe([seconds(0.6), seconds(0.7)]) == ['one', 'two']
+    assert fake_whisper.decoded[0][2]['without_timestamps'] is False
+    assert model.transcribe_calls == 0
+
+
+def test_long_audio_uses_full_window(fake_whisper):
+    model = FakeModel()
+    packer = UtterancePacker(model, short_window_seconds=5)
+    assert packer.transcribe([seconds(6)]) == ['full']
+    assert model.transcribe_calls == 1
+
+
+def test_reduced_window_pads_audio_not_mel(fake_whisper):
+    packer = UtterancePacker(FakeModel(), short_window_seconds=10)
+    packer.transcribe([seconds(1.3)])
+    assert fake_whisper.mel_samples == [2 * SAMPLE_RATE]
+
+
+def test_reduced_window_drops_silence(fake_whisper):
+    fake_whisper.speech.no_speech_prob = 0.9
+    fake_whisper.speech.avg_logprob = -1.5
+    packer = UtterancePacker(FakeModel(), short_window_seconds=10)
+    assert packer.transcribe([seconds(1)]) == ['']
+    assert packer.transcribe([seconds(0.6), seconds(0.7)]) == ['', '']
@@ -1,4 +1,4 @@
-import React, { useState, useEffect} from 'react';
+import React, { useState, useEffect } from 'react';
 import layoutStyles from './components/common/ColumnLayout/ColumnLayout.module.css';
 import headerStyles from './components/common/Header/Header.module.css';
 import {FaGithub, FaSun, FaMoon, FaInfoCircle} from 'react-icons/fa';
@@ -10,6 +10,10 @@ import CombinedDefinitionCard from './components/cards/CombinedDefinitionCard/Co
 const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
 const DEFINITIONS_CACHE_KEY = 'wf_teams_definitions_cache';
 
+const newSessionId = () => (window.crypto && window.crypto.randomUUID
+  ? window.crypto.randomUUID()
+  : `${Date.now()}-${Math.random().toString(36).slice(2)}`);
+
 function App() {
   const [isRecording, setIsRecording] = useState(false);
   const [transcription, setTranscription] = useState('');
@@ -18,6 +22,8 @@ function App() {
   const [hasTranscribed, setHasTranscribed] = useState(false);
   const [definitions, setDefinitions] = useState([]);
   const [infoOpen, setInfoOpen] = useState(false);
+  const [sessionId, setSessionId] = useState(newSessionId);
+  const [actionItems, setActionItems] = useState([]);
   
   useEffect(() => {
     const cached = localStorage.getItem(DEFINITIONS_CACHE_KEY);
@@ -30,6 +36,21 @@ function App() {
     }
   }, []);
 
+  // Action items are pushed by the backend as transcript blocks are summarized
+  useEffect(() => {
+    setActionItems([]);
+    const source = new EventSource(`${API_URL}/meeting/${sessionId}/stream`);
+    source.onmessage = (event) => {
+      try {
+        const data = JSON.parse(event.data);
+        setActionItems(data.action_items || []);
+      } catch {
+        // Ignore malformed events
+      }
+    };
+    return () => source.close();
+  }, [sessionId]);
+
   useEffect(() => {
     document.body.setAttribute('data-theme', darkMode ? 'dark' : 'light');
   }, [darkMode]);
@@ -58,6 +79,8 @@ function App() {
     localStorage.removeItem(DEFINITIONS_CACHE_KEY);
     setTranscription('');
     setHasTranscribed(false);
+    fetch(`${API_URL}/llm/sessions/${sessionId}`, { method: 'DELETE' }).catch(() => {});
+    setSessionId(newSessionId());
   };
 
   // Handler for new chunk ready from MeetingTranscript
@@ -67,7 +90,7 @@ function App() {
       const res = await fetch(`${API_URL}/llm/extract_terms`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ chunk, context })
+        body: JSON.stringify({ chunk, context, session_id: sessionId })
       });
       if (res.ok) {
         const data = await res.json();
@@ -146,10 +169,17 @@ function App() {
         <div className={layoutStyles['column'] + ' action-items-column glass'}>
           <div className={layoutStyles['column-title']}>Action Items</div>
           <div className={layoutStyles['action-items-box'] + ' card-scroll'}>
-            <ActionItemCard title="Finalize API Gateway Configuration" description="Ensure the API gateway is robust and scalable for the new microservices." />
-            <ActionItemCard title="Review Data Lake Migration Performance" description="Check current ETL process efficiency and overall data lake performance." />
-            <ActionItemCard title="Train Machine Learning Models" description="Continue training neural network models for fraud detection." />
-            <ActionItemCard title="Research Blockchain Integration" description="Explore smart contracts on the Ethereum network for supply chain transparency." />
+            {actionItems.length === 0 ? (
+              <div>No action items yet.</div>
+            ) : (
+              actionItems.map((item, idx) => (
+                <ActionItemCard
+                  key={idx}
+                  title={item.title}
+                  description={item.owner ? `${item.description} (${item.owner})` : item.description}
+                />
+              ))
+            )}
           </div>
         </div>
       </div>
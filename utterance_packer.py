@@ -0,0 +1,183 @@
+import queue
+import time
+import numpy as np
+
+# Same values as whisper.audio; whisper (and torch) are only imported when needed
+SAMPLE_RATE = 16000
+HOP_LENGTH = 160           # audio samples per mel frame
+N_SAMPLES_PER_TOKEN = 320  # HOP_LENGTH * 2: audio samples per encoder frame
+N_AUDIO_CTX = 1500         # encoder frames in a full 30 s window
+TIME_PRECISION = 0.02      # seconds per timestamp token
+# whisper.transcribe's defaults: a window counts as silence when both hold
+NO_SPEECH_THRESHOLD = 0.6
+LOGPROB_THRESHOLD = -1.0
+
+# Whisper always encodes a fixed 30 s log-mel window, so a 1-3 s utterance pays
+# for a full encoder pass. The packer lays several short utterances out in one
+# window (separated by silence), runs a single decode and splits the words back
+# to the utterance they came from.
+WINDOW_SECONDS = 30.0
+GAP_SECONDS = 0.5        # silence inserted between packed utterances
+MAX_UTTERANCES = 8       # max utterances packed into one window
+PACK_MAX_WAIT = 0.25     # seconds to wait for more utterances after the first one
+PACK_TARGET_SECONDS = 8.0   # stop waiting once this much audio is packed
+
+
+class UtterancePacker:
+    def __init__(self, model, gap_seconds=GAP_SECONDS, window_seconds=WINDOW_SECONDS,
+                 max_utterances=MAX_UTTERANCES, short_window_seconds=None, language="en", fp16=False):
+        if short_window_seconds is not None and not 0 < short_window_seconds <= window_seconds:
+            raise ValueError(f"short_window_seconds must be in (0, {window_seconds}], got {short_window_seconds}")
+        self.model = model
+        self.gap_seconds = gap_seconds
+        self.window_seconds = window_seconds
+        self.max_utterances = max_utterances
+        # If set, packed audio no longer than this is decoded with an encoder
+        # window sized to the audio instead of the full 30 s one.
+        self.short_window_seconds = short_window_seconds
+        self.language = language
+        self.fp16 = fp16
+
+    def fits(self, utterances, audio_np):
+        """Return True if audio_np can be appended to utterances in the same window."""
+        if len(utterances) >= self.max_utterances:
+            return False
+        total = sum(len(u) for u in utterances) + len(audio_np)
+        total += int(self.gap_seconds * SAMPLE_RATE) * len(utterances)
+        return total <= self.window_seconds * SAMPLE_RATE
+
+    def gather(self, source, pending=None, convert=None, max_wait=PACK_MAX_WAIT, target_seconds=PACK_TARGET_SECONDS):
+        """Take utterances from the queue source for one window.
+
+        Blocks for the first utterance (or uses pending), then takes the ones
+        already queued and waits up to max_wait seconds for more, until
+        target_seconds of audio are packed or the window is full. Every caption
+        in the window is delayed by up to max_wait; 0 only drains the queue.
+        Returns (utterances, pending), where pending is an utterance that did
+        not fit and starts the next window.
+        """
+        convert = convert or (lambda item: item)
+        utterances = [pending if pending is not None else convert(source.get())]
+        total = len(utterances[0])
+        deadline = time.monotonic() + max_wait
+        while total < target_seconds * SAMPLE_RATE and len(utterances) < self.max_utterances:
+            remaining = deadline - time.monotonic()
+            try:
+                item = source.get(timeout=remaining) if remaining > 0 else source.get_nowait()
+            except queue.Empty:
+                break
+            audio_np = convert(item)
+            if not self.fits(utterances, audio_np):
+                return utterances, audio_np
+            utterances.append(audio_np)
+            total += len(audio_np)
+        return utterances, None
+
+    def short_window_frames(self, n_samples):
+        """Mel frames in a reduced encoder window covering n_samples, rounded up to whole seconds.
+
+        Two mel frames per encoder frame, never more than a full 30 s window.
+        """
+        seconds = max(1, int(np.ceil(n_samples / SAMPLE_RATE)))
+        n_ctx = seconds * SAMPLE_RATE // N_SAMPLES_PER_TOKEN
+        return min(n_ctx, N_AUDIO_CTX) * 2
+
+    def pack(self, utterances):
+        """Concatenate utterances with silence gaps. Returns (audio, [(start, end), ...]) in seconds."""
+        gap = np.zeros(int(self.gap_seconds * SAMPLE_RATE), dtype=np.float32)
+        parts = []
+        spans = []
+        offset = 0
+        for i, audio_np in enumerate(utterances):
+            if i:
+                parts.append(gap)
+                offset += len(gap)
+            parts.append(audio_np.astype(np.float32))
+            spans.append((offset / SAMPLE_RATE, (offset + len(audio_np)) / SAMPLE_RATE))
+            offset += len(audio_np)
+        return np.concatenate(parts), spans
+
+    def transcribe(self, utterances):
+        """Transcribe a list of float32 16 kHz utterances, returning one string per utterance."""
+        if not utterances:
+            return []
+        if len(utterances) == 1:
+            audio_np, spans = utterances[0], None
+        else:
+            audio_np, spans = self.pack(utterances)
+
+        if self.short_window_seconds and len(audio_np) <= self.short_window_seconds * SAMPLE_RATE:
+            result = self._decode_short(audio_np, with_timestamps=spans is not None)
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+                return [''] * len(utterances)  # silence; don't caption whatever the decoder made up
+            if spans is None:
+                return [result.text.strip()]
+            return self._split(self._segments(result.tokens), spans)
+
+        if spans is None:
+            result = self.model.transcribe(audio_np, language=self.language, fp16=self.fp16)
+            return [result['text'].strip()]
+        result = self.model.transcribe(audio_np, language=self.language, fp16=self.fp16,
+                                       word_timestamps=True, condition_on_previous_text=False)
+        return self._split(result['segments'], spans)
+
+    def _split(self, segments, spans):
+        # Assign each word (or segment, if the model gave no words) to the
+        # utterance whose span, widened by half a gap, contains its midpoint.
+        half_gap = self.gap_seconds / 2
+        texts = [[] for _ in spans]
+        for segment in segments:
+            pieces = segment.get('words') or [{'word': segment['text'], 'start': segment['start'], 'end': segment['end']}]
+            for piece in pieces:
+                mid = (piece['start'] + piece['end']) / 2
+                for i, (start, end) in enumerate(spans):
+                    if mid < end + half_gap or i == len(spans) - 1:
+                        texts[i].append(piece['word'])
+                        break
+        return [''.join(words).strip() for words in texts]
+
+    def _decode_short(self, audio_np, with_timestamps=False):
+        # Pad the audio with silence to whole seconds and slice the encoder's
+        # positional embedding to match, so the encoder runs over a few hundred
+        # frames instead of 1500. Padding the audio rather than the mel keeps
+        # the padding silent after log-mel normalization, as in transcribe.
+        import whisper
+        encoder = self.model.encoder
+        full_embedding = encoder.positional_embedding
+        n_frames = self.short_window_frames(len(audio_np))
+        audio_np = np.pad(audio_np.astype(np.float32), (0, max(0, n_frames * HOP_LENGTH - len(audio_np))))
+        mel = whisper.log_mel_spectrogram(audio_np, n_mels=self.model.dims.n_mels)
+        mel = whisper.pad_or_trim(mel, n_frames).to(self.model.device)
+        options = whisper.DecodingOptions(language=self.language, fp16=self.fp16,
+                                          without_timestamps=not with_timestamps)
+        try:
+            encoder.positional_embedding = full_embedding[: n_frames // 2]
+            return whisper.decode(self.model, mel, options)
+        finally:
+            encoder.positional_embedding = full_embedding
+
+    def _segments(self, tokens):
+        # Rebuild (text, start, end) segments from the timestamp tokens of a
+        # decode: <|start|> text <|end|><|start|> text <|end|> ...
+        from whisper.tokenizer import get_tokenizer
+        tokenizer = get_tokenizer(self.model.is_multilingual, num_languages=getattr(self.model, 'num_languages', 99),
+                                  language=self.language, task="transcribe")
+        segments = []
+        start = None
+        text_tokens = []
+        for token in tokens:
+            if token < tokenizer.timestamp_begin:
+                text_tokens.append(token)
+                continue
+            t = (token - tokenizer.timestamp_begin) * TIME_PRECISION
+            if start is None:
+                start = t
+                continue
+            if text_tokens:
+                segments.append({'text': tokenizer.decode(text_tokens), 'start': start, 'end': t})
+            text_tokens = []
+            start = None
+        if text_tokens:
+            end = segments[-1]['end'] if start is None and segments else (start or 0.0)
+            segments.append({'text': tokenizer.decode(text_tokens), 'start': end, 'end': end})
+        return segments